@@ -0,0 +1,140 @@
+import hashlib
+import json
+
+from flask import request, abort, jsonify, current_app
+from sqlalchemy.orm import selectinload
+
+
+class Resource:
+    '''
+    JSON representation of a model.
+
+    `fields` maps a field name to an attribute name or to a function of the
+    row. `relations` maps a relation name to (relationship attribute, name
+    of the related resource). `loaders` maps a field to the relationship it
+    reads (like genres and genre_list), loaded with the rows when the field
+    is asked for.
+    '''
+
+    def __init__(self, name, model, fields, relations=None, loaders=None):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.relations = relations or {}
+        self.loaders = loaders or {}
+
+    def value(self, row, field):
+        get = self.fields[field]
+        return get(row) if callable(get) else getattr(row, get)
+
+
+class JsonApi:
+    '''
+    Registry of the resources of the versioned JSON API.
+
+    Requests pick the fields of each resource with `fields=` (the requested
+    resource) or `fields[<resource>]=`, and embed related resources with
+    `include=`, dotted for nested relations (include=shows.artist). Every
+    included relation and field loader becomes a selectinload option, so a
+    response costs one query per relation whatever the number of rows.
+    '''
+
+    def __init__(self):
+        self.resources = {}
+
+    def resource(self, name, model, fields, relations=None, loaders=None):
+        self.resources[name] = Resource(name, model, fields, relations, loaders)
+
+    # read the include tree and the fieldsets of the request, 400 on unknown
+    # relations or fields
+    def parse(self, name):
+        tree = {}
+        for path in filter(None, request.args.get('include', '').split(',')):
+            resource = self.resources[name]
+            node = tree
+            for relation in path.split('.'):
+                if relation not in resource.relations:
+                    error(400, 'unknown relation {} of {}'.format(relation, resource.name))
+                node = node.setdefault(relation, {})
+                resource = self.resources[resource.relations[relation][1]]
+
+        fieldsets = {}
+        for key, value in request.args.items():
+            if key == 'fields':
+                key = name
+            elif key.startswith('fields[') and key.endswith(']'):
+                key = key[len('fields['):-1]
+            else:
+                continue
+            if key not in self.resources:
+                error(400, 'unknown resource {}'.format(key))
+            fields = [field for field in value.split(',') if field]
+            for field in fields:
+                if field not in self.resources[key].fields:
+                    error(400, 'unknown field {} of {}'.format(field, key))
+            fieldsets[key] = fields
+        return tree, fieldsets
+
+    def _fields(self, resource, fieldsets):
+        return fieldsets.get(resource.name, list(resource.fields))
+
+    # the loader options of the included relations and loaded fields
+    def options(self, name, tree, fieldsets, parent=None):
+        resource = self.resources[name]
+
+        def load(attribute):
+            attribute = getattr(resource.model, attribute)
+            return selectinload(attribute) if parent is None else parent.selectinload(attribute)
+
+        options = [load(resource.loaders[field])
+                   for field in self._fields(resource, fieldsets)
+                   if field in resource.loaders]
+        for relation, subtree in tree.items():
+            attribute, target = resource.relations[relation]
+            loader = load(attribute)
+            options.append(loader)
+            options += self.options(target, subtree, fieldsets, loader)
+        return options
+
+    def serialize(self, name, row, tree, fieldsets):
+        resource = self.resources[name]
+        data = {'id': row.id}
+        for field in self._fields(resource, fieldsets):
+            data[field] = resource.value(row, field)
+        for relation, subtree in tree.items():
+            attribute, target = resource.relations[relation]
+            related = getattr(row, attribute)
+            if related is None:
+                data[relation] = None
+            elif isinstance(related, list):
+                data[relation] = [self.serialize(target, item, subtree, fieldsets)
+                                  for item in related]
+            else:
+                data[relation] = self.serialize(target, related, subtree, fieldsets)
+        return data
+
+
+# abort with a JSON error body
+def error(status, message):
+    response = jsonify({'error': status, 'message': message})
+    response.status_code = status
+    abort(response)
+
+
+# JSON response built by `build`, tagged with the hash of `version` (the
+# version of the data it is built from) and of the url. The client that
+# already has it (If-None-Match) is answered with an empty 304 before the
+# response is built. Without a version the tag is the hash of the body.
+def json_response(build, version=None):
+    response = current_app.response_class(mimetype='application/json')
+    if version is not None:
+        tag = '{}:{}'.format(version, request.full_path)
+        response.set_etag(hashlib.sha1(tag.encode('utf-8')).hexdigest())
+        if request.if_none_match.contains(response.get_etag()[0]):
+            return response.make_conditional(request)
+
+    body = json.dumps(build(), separators=(',', ':'), sort_keys=True)
+    response.set_data(body)
+    if version is None:
+        response.set_etag(hashlib.sha1(body.encode('utf-8')).hexdigest())
+    return response.make_conditional(request)
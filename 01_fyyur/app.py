@@ -3,18 +3,30 @@
 #----------------------------------------------------------------------------#
 
 import json
+from datetime import datetime, timedelta
+from itertools import groupby
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, session
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, session, stream_with_context, g
 from werkzeug.datastructures import MultiDict
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-import logging
-from logging import Formatter, FileHandler
+from sqlalchemy import event, DDL
+from sqlalchemy.engine import Engine
+import sqlite3
 from forms import *
-
-import sys
+from pagination import KeysetPage, page_args
+from search import ModelSearch
+from timeline import load_timeline
+from cache import RenderCache
+from formatting import DateTimeFormatter
+from instrumentation import Instrumentation
+from query_budget import QueryBudget
+from structured_logging import init_logging
+from db_pool import engine_options, pool_metrics
+from replicas import RoutingSQLAlchemy, RoutingSession
+from api import JsonApi, error as api_error, json_response
+from booking import BookingConflict, BookedCalendars, CalendarLocks, free_slots, VENUE_CALENDAR, ARTIST_CALENDAR
+from geo import encode_geohash, geohash_block, block_coverage_km, precision_for_radius, haversine_km
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -24,34 +36,97 @@ app = Flask(__name__)
 
 moment = Moment(app)
 app.config.from_object('config')
+# pool sizing, recycling and pre-ping from the DB_POOL_* environment
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
-db = SQLAlchemy(app)
+# GET requests read from the replicas, see replicas.RoutingSQLAlchemy
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+render_cache = RenderCache()
+render_cache.init_app(app)
+instrumentation = Instrumentation(app)
+instrumentation.add_collector(lambda: pool_metrics(db.engine))
+QueryBudget(instrumentation, app)
+init_logging(app)
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 
+# genres of the venues and artists, the (genre_id, entity id) indexes
+# answer the browse by genre pages
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id'))
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id'))
+
+
+class Genre(db.Model):  # Genre database model
+    __tablename__ = 'genres'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'<Genre {self.id} {self.name}>'
+
+
 class Venue(db.Model):  # Venue database model
     __tablename__ = 'venues'
+    __table_args__ = (
+        # sort key of the keyset paginated venues listing
+        db.Index('ix_venues_state_city_id', 'state', 'city', 'id'),
+        # trigram index serving the partial match venue search on postgres
+        db.Index(
+            'ix_venues_name_trgm',
+            'name',
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
+    # location, the indexed geohash answers the nearby venues queries
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)
     phone = db.Column(db.String(120))
+    # E.164 form of the phone number, for lookups and deduplication
+    phone_e164 = db.Column(db.String(16), index=True)
     genres = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
+    # denormalized show counters, see the Show counters section
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
+    # the shows are deleted by the ON DELETE CASCADE of their foreign key
     shows = db.relationship(
         'Show',
         backref='venue',
+        lazy=True,
+        passive_deletes=True)
+
+    # the genres column keeps the submitted comma separated genres, the
+    # genre_list relationship is the normalized copy used for reading
+    genre_list = db.relationship(
+        'Genre',
+        secondary=venue_genres,
+        order_by='Genre.name',
         lazy=True)
 
     def __repr__(self):
@@ -60,22 +135,47 @@ class Venue(db.Model):  # Venue database model
 
 class Artist(db.Model):  # Artist database model
     __tablename__ = 'artists'
+    __table_args__ = (
+        # sort key of the keyset paginated artists listing
+        db.Index('ix_artists_name_id', 'name', 'id'),
+        # trigram index serving the partial match artist search on postgres
+        db.Index(
+            'ix_artists_name_trgm',
+            'name',
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
+    # E.164 form of the phone number, for lookups and deduplication
+    phone_e164 = db.Column(db.String(16), index=True)
     genres = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
+    # denormalized show counters, see the Show counters section
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
+    # the shows are deleted by the ON DELETE CASCADE of their foreign key
     shows = db.relationship(
         'Show',
         backref='artist',
+        lazy=True,
+        passive_deletes=True)
+
+    # the genres column keeps the submitted comma separated genres, the
+    # genre_list relationship is the normalized copy used for reading
+    genre_list = db.relationship(
+        'Genre',
+        secondary=artist_genres,
+        order_by='Genre.name',
         lazy=True)
 
     def __repr__(self):
@@ -84,36 +184,614 @@ class Artist(db.Model):  # Artist database model
 
 class Show(db.Model):  # Show database model
     __tablename__ = 'shows'
+    __table_args__ = (
+        # access paths of the venue and artist pages and of /shows
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
     artist_id = db.Column(
         db.Integer,
         db.ForeignKey(
-            'artists.id'),
+            'artists.id', ondelete='CASCADE'),
         nullable=False)
     venue_id = db.Column(
         db.Integer,
         db.ForeignKey(
-            'venues.id'),
+            'venues.id', ondelete='CASCADE'),
         nullable=False)
 
+
+class ShowCounterState(db.Model):  # single row, time up to which shows are counted as past
+    __tablename__ = 'show_counter_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_over_at = db.Column(db.DateTime, nullable=False)
+
+
+# the trigram indexes need the pg_trgm extension when the tables are created
+# without the migrations (db.create_all)
+for table in (Venue.__table__, Artist.__table__):
+    event.listen(
+        table,
+        'before_create',
+        DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# the counter state starts at the creation time of the (empty) tables
+event.listen(
+    ShowCounterState.__table__,
+    'after_create',
+    lambda target, connection, **kw: connection.execute(
+        target.insert().values(id=1, rolled_over_at=datetime.now())))
+
+
+
+# SQLite only enforces the foreign keys, and their cascades, when asked to
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
+venue_search = ModelSearch(db, Venue, Venue.name)
+artist_search = ModelSearch(db, Artist, Artist.name)
+
 #----------------------------------------------------------------------------#
-# Filters.
+# Show counters.
 #----------------------------------------------------------------------------#
 
+# Venues and artists keep their number of upcoming and past shows. A show
+# is counted as past if it started before ShowCounterState.rolled_over_at:
+# new shows are counted when they are created and the periodic roll-over
+# job (show_counters.py) moves the shows that started since the last run
+# from upcoming to past.
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+COUNTED_MODELS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
 
 
+# count a new show in its venue and artist counters, in the same transaction
+def count_new_show(show):
+    # the shared lock waits for a running roll-over to commit
+    rolled_over_at = ShowCounterState.query\
+        .with_for_update(read=True)\
+        .one()\
+        .rolled_over_at
+    upcoming = show.start_time >= rolled_over_at
+
+    for model, entity_id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+        counter = model.upcoming_shows_count if upcoming else model.past_shows_count
+        model.query.filter(model.id == entity_id)\
+            .update({counter: counter + 1}, synchronize_session=False)
+
+
+# move the shows that started since the last roll-over from the upcoming to
+# the past counters, return the number of shows moved
+def rollover_show_counters(now=None):
+    now = now or datetime.now()
+    state = ShowCounterState.query.with_for_update().one()
+    if now <= state.rolled_over_at:
+        db.session.rollback()
+        return 0
+
+    window = db.and_(Show.start_time >= state.rolled_over_at, Show.start_time < now)
+    moved = db.session.query(db.func.count(Show.id)).filter(window).scalar()
+
+    if moved:
+        for model, foreign_key in COUNTED_MODELS:
+            started = db.session.query(db.func.count(Show.id))\
+                .filter(foreign_key == model.id)\
+                .filter(window)\
+                .correlate(model)\
+                .as_scalar()
+            model.query\
+                .filter(model.id.in_(db.session.query(foreign_key).filter(window)))\
+                .update({
+                    model.upcoming_shows_count: model.upcoming_shows_count - started,
+                    model.past_shows_count: model.past_shows_count + started
+                }, synchronize_session=False)
+
+    state.rolled_over_at = now
+    db.session.commit()
+    return moved
+
+
+# compare every counter with a full recount, return the differences as
+# (table, id, (stored upcoming, stored past), (upcoming, past)) and rewrite
+# the wrong counters if fix is True
+def check_show_counters(fix=False):
+    rolled_over_at = ShowCounterState.query.one().rolled_over_at
+    differences = []
+
+    for model, foreign_key in COUNTED_MODELS:
+        def recount(condition):
+            return db.session.query(db.func.count(Show.id))\
+                .filter(foreign_key == model.id)\
+                .filter(condition)\
+                .correlate(model)\
+                .as_scalar()
+
+        upcoming = recount(Show.start_time >= rolled_over_at)
+        past = recount(Show.start_time < rolled_over_at)
+        rows = db.session.query(
+            model.id,
+            model.upcoming_shows_count,
+            model.past_shows_count,
+            upcoming,
+            past)\
+            .filter(db.or_(model.upcoming_shows_count != upcoming, model.past_shows_count != past))\
+            .order_by(model.id)\
+            .all()
+        differences.extend(
+            (model.__tablename__, row[0], (row[1], row[2]), (row[3], row[4]))
+            for row in rows)
+
+        if fix and rows:
+            model.query\
+                .filter(model.id.in_([row[0] for row in rows]))\
+                .update({
+                    model.upcoming_shows_count: upcoming,
+                    model.past_shows_count: past
+                }, synchronize_session=False)
+
+    if fix:
+        db.session.commit()
+    return differences
+
+# delete venues and, through the ON DELETE CASCADE of shows.venue_id, their
+# shows, after taking these shows out of the artists counters. Return the
+# ids of the deleted venues and of the artists of their shows, the caller
+# commits
+def delete_venues(venue_ids):
+    venue_ids = sorted(set(venue_ids))
+    if not venue_ids:
+        return [], []
+
+    rolled_over_at = ShowCounterState.query\
+        .with_for_update(read=True)\
+        .one()\
+        .rolled_over_at
+    of_venues = Show.venue_id.in_(venue_ids)
+    artist_ids = [artist_id for (artist_id,) in
+                  db.session.query(Show.artist_id).filter(of_venues).distinct()]
+
+    if artist_ids:
+        def shows_count(condition):
+            return db.session.query(db.func.count(Show.id))\
+                .filter(Show.artist_id == Artist.id)\
+                .filter(of_venues)\
+                .filter(condition)\
+                .correlate(Artist)\
+                .as_scalar()
+
+        Artist.query.filter(Artist.id.in_(artist_ids)).update({
+            Artist.upcoming_shows_count:
+                Artist.upcoming_shows_count - shows_count(Show.start_time >= rolled_over_at),
+            Artist.past_shows_count:
+                Artist.past_shows_count - shows_count(Show.start_time < rolled_over_at)
+        }, synchronize_session=False)
+
+    deleted = [venue_id for (venue_id,) in
+               db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))]
+    Venue.query.filter(Venue.id.in_(venue_ids)).delete(synchronize_session=False)
+    return deleted, artist_ids
+
+#----------------------------------------------------------------------------#
+# Genres.
+#----------------------------------------------------------------------------#
+
+
+# return the Genre rows of a list of genre names, creating the missing ones
+def genres_by_name(names):
+    names = list(dict.fromkeys(name for name in names if name))
+    genres = Genre.query.filter(Genre.name.in_(names)).all() if names else []
+    known = {genre.name for genre in genres}
+    for name in names:
+        if name not in known:
+            genre = Genre(name=name)
+            db.session.add(genre)
+            genres.append(genre)
+    return genres
+
+
+# set the genres of a venue or an artist, both the comma separated column
+# and the normalized genre_list
+def set_genres(entity, names):
+    entity.genres = ','.join(names)
+    entity.genre_list = genres_by_name(names)
+
+
+# link the venues or artists selected by `condition` to the genres named in
+# their genres column, in one INSERT ... SELECT (used by the bulk import)
+def link_genres(model, association, condition):
+    foreign_key = [column for column in association.c if column.name != 'genre_id'][0]
+    matching = db.select([model.id, Genre.id])\
+        .where(condition)\
+        .where((',' + model.genres + ',').like('%,' + Genre.name + ',%'))
+    db.session.execute(
+        association.insert().from_select([foreign_key.name, 'genre_id'], matching))
+
+#----------------------------------------------------------------------------#
+# Locations.
+#----------------------------------------------------------------------------#
+
+# precision of the first cells searched for the nearest venues (~150m)
+NEARBY_START_PRECISION = 7
+
+
+def set_location(venue, latitude, longitude):
+    if latitude is None or longitude is None:
+        venue.latitude = venue.longitude = venue.geohash = None
+    else:
+        venue.latitude = latitude
+        venue.longitude = longitude
+        venue.geohash = encode_geohash(latitude, longitude)
+
+
+# return the sorted (distance in km, venue row) of the venues in the block of
+# geohash cells around a point at a precision, every located venue for 0
+def nearby_candidates(latitude, longitude, precision):
+    query = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.latitude,
+        Venue.longitude)\
+        .filter(Venue.geohash.isnot(None))
+    if precision:
+        # a geohash prefix is a range of the geohash index
+        query = query.filter(db.or_(*[
+            db.and_(Venue.geohash >= cell, Venue.geohash < cell + '~')
+            for cell in geohash_block(latitude, longitude, precision)]))
+
+    candidates = [
+        (haversine_km(latitude, longitude, row.latitude, row.longitude), row)
+        for row in query]
+    candidates.sort(key=lambda candidate: (candidate[0], candidate[1].id))
+    return candidates
+
+
+# the venues within radius_km of a point, or its k nearest venues, or the
+# k nearest ones within the radius, as sorted (distance, venue row)
+def venues_near(latitude, longitude, k=None, radius_km=None):
+    if radius_km is not None:
+        precision = precision_for_radius(latitude, radius_km)
+        found = [candidate for candidate in nearby_candidates(latitude, longitude, precision)
+                 if candidate[0] <= radius_km]
+        return found[:k] if k else found
+
+    # widen the block until it holds k venues closer than the distance it
+    # is sure to cover: any venue outside of it is farther than those
+    for precision in range(NEARBY_START_PRECISION, -1, -1):
+        found = nearby_candidates(latitude, longitude, precision)
+        covered = block_coverage_km(latitude, precision) if precision else float('inf')
+        if len(found) >= k and found[k - 1][0] <= covered or precision == 0:
+            return found[:k]
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+# Every show lasts SHOW_DURATION_MINUTES, two shows of the same venue or
+# artist overlap when they start less than that apart. The conflicts are
+# range scans of the (venue_id, start_time) and (artist_id, start_time)
+# indexes, and the calendar locks serialize the concurrent bookings.
+
+calendar_locks = CalendarLocks()
+
+
+def show_duration():
+    return timedelta(minutes=app.config['SHOW_DURATION_MINUTES'])
+
+
+# lock the calendars of a venue and an artist until the end of the block
+# (or of the transaction on postgres)
+def lock_calendars(venue_id, artist_id):
+    return calendar_locks.hold(
+        db.session, [(VENUE_CALENDAR, venue_id), (ARTIST_CALENDAR, artist_id)])
+
+
+# lock the calendars of several venues or artists
+def lock_calendars_of(calendar, entity_ids):
+    return calendar_locks.hold(db.session, [(calendar, entity_id) for entity_id in entity_ids])
+
+
+# lock the venue and artist calendars of (venue_id, artist_id) bookings
+def lock_calendars_of_bookings(bookings):
+    return calendar_locks.hold(db.session, [
+        key
+        for venue_id, artist_id in bookings
+        for key in ((VENUE_CALENDAR, venue_id), (ARTIST_CALENDAR, artist_id))])
+
+
+# raise BookingConflict if a show at start_time would overlap a show of the
+# venue or of the artist
+def check_booking(venue_id, artist_id, start_time):
+    duration = show_duration()
+    for calendar, foreign_key, entity_id in ((VENUE_CALENDAR, Show.venue_id, venue_id),
+                                             (ARTIST_CALENDAR, Show.artist_id, artist_id)):
+        conflicts = db.session.query(Show.id)\
+            .filter(foreign_key == entity_id)\
+            .filter(Show.start_time > start_time - duration)\
+            .filter(Show.start_time < start_time + duration)\
+            .all()
+        if conflicts:
+            raise BookingConflict(calendar, [show_id for (show_id,) in conflicts])
+
+
+# check a batch of (venue_id, artist_id, start_time) bookings against the
+# shows of the database and the earlier bookings of the batch, in one query.
+# Returns {index: calendar} of the bookings that would overlap a show
+def check_bookings(bookings):
+    if not bookings:
+        return {}
+    duration = show_duration()
+    starts = [start_time for _, _, start_time in bookings]
+    calendars = BookedCalendars(duration)
+    booked = db.session.query(Show.venue_id, Show.artist_id, Show.start_time)\
+        .filter(db.or_(
+            Show.venue_id.in_({venue_id for venue_id, _, _ in bookings}),
+            Show.artist_id.in_({artist_id for _, artist_id, _ in bookings})))\
+        .filter(Show.start_time > min(starts) - duration)\
+        .filter(Show.start_time < max(starts) + duration)
+    for venue_id, artist_id, start_time in booked:
+        calendars.book(venue_id, artist_id, start_time)
+
+    conflicts = {}
+    for index, (venue_id, artist_id, start_time) in enumerate(bookings):
+        calendar = calendars.conflict(venue_id, artist_id, start_time)
+        if calendar is None:
+            calendars.book(venue_id, artist_id, start_time)
+        else:
+            conflicts[index] = calendar
+    return conflicts
+
+
+# free slots of a venue or an artist calendar between start and end
+def calendar_free_slots(foreign_key, entity_id, start, end):
+    duration = show_duration()
+    busy = db.session.query(Show.start_time)\
+        .filter(foreign_key == entity_id)\
+        .filter(Show.start_time > start - duration)\
+        .filter(Show.start_time < end)\
+        .order_by(Show.start_time)
+    return free_slots([show_start for (show_start,) in busy], start, end, duration)
+
+
+def availability_response(foreign_key, entity_id):
+    start = date_arg('from', datetime.now())
+    end = date_arg('to', start + timedelta(days=app.config['AVAILABILITY_WINDOW_DAYS']))
+    if end <= start or end - start > timedelta(days=app.config['AVAILABILITY_MAX_DAYS']):
+        abort(400)
+
+    slots = calendar_free_slots(foreign_key, entity_id, start, end)
+    return jsonify({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'show_duration_minutes': app.config['SHOW_DURATION_MINUTES'],
+        'free_slots': [{
+            'start': slot_start.isoformat(),
+            'end': slot_end.isoformat()
+        } for slot_start, slot_end in slots]
+    })
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+api = JsonApi()
+
+api.resource('venues', Venue, fields={
+    'name': 'name',
+    'city': 'city',
+    'state': 'state',
+    'address': 'address',
+    'phone': 'phone',
+    'genres': lambda venue: [genre.name for genre in venue.genre_list],
+    'image_link': 'image_link',
+    'facebook_link': 'facebook_link',
+    'website': 'website',
+    'seeking_talent': 'seeking_talent',
+    'seeking_description': 'seeking_description',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'upcoming_shows_count': 'upcoming_shows_count',
+    'past_shows_count': 'past_shows_count'
+}, relations={
+    'shows': ('shows', 'shows')
+}, loaders={
+    'genres': 'genre_list'
+})
+
+api.resource('artists', Artist, fields={
+    'name': 'name',
+    'city': 'city',
+    'state': 'state',
+    'phone': 'phone',
+    'genres': lambda artist: [genre.name for genre in artist.genre_list],
+    'image_link': 'image_link',
+    'facebook_link': 'facebook_link',
+    'website': 'website',
+    'seeking_venue': 'seeking_venue',
+    'seeking_description': 'seeking_description',
+    'upcoming_shows_count': 'upcoming_shows_count',
+    'past_shows_count': 'past_shows_count'
+}, relations={
+    'shows': ('shows', 'shows')
+}, loaders={
+    'genres': 'genre_list'
+})
+
+api.resource('shows', Show, fields={
+    'start_time': lambda show: show.start_time.isoformat(),
+    'venue_id': 'venue_id',
+    'artist_id': 'artist_id'
+}, relations={
+    'venue': ('venue', 'venues'),
+    'artist': ('artist', 'artists')
+})
+
+
+# The responses of the API are tagged with the version of the ('api',)
+# render cache tag, renewed after every commit that wrote, so a client
+# revalidating them gets its 304 without a query. A response read from a
+# replica, which can miss the last writes, is tagged with its hash instead.
+API_TAG = ('api',)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def remember_api_write(db_session, flush_context):
+    db_session.info['api_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_bulk_update')
+@event.listens_for(RoutingSession, 'after_bulk_delete')
+def remember_api_bulk_write(bulk_context):
+    bulk_context.session.info['api_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def invalidate_api_responses(db_session):
+    if db_session.info.pop('api_wrote', False):
+        render_cache.invalidate(API_TAG)
+
+
+def api_version():
+    if g.get('db_replica') is not None:
+        return None
+    return render_cache.version([API_TAG])
+
+
+# one resource of the API, by id
+def api_item_response(name, item_id):
+    model = api.resources[name].model
+    tree, fieldsets = api.parse(name)
+
+    def build():
+        row = model.query.options(*api.options(name, tree, fieldsets)).get(item_id)
+        if row is None:
+            api_error(404, '{} {} not found'.format(name, item_id))
+        return {'data': api.serialize(name, row, tree, fieldsets)}
+
+    return json_response(build, api_version())
+
+
+# keyset paginated list of a resource, ordered by id
+def api_list_response(name):
+    model = api.resources[name].model
+    tree, fieldsets = api.parse(name)
+    after, limit = page_args(
+        app.config['LISTING_PAGE_SIZE'],
+        app.config['LISTING_MAX_PAGE_SIZE'],
+        key_types=(int,),
+        invalid=lambda: api_error(400, 'invalid cursor'))
+
+    def build():
+        page = KeysetPage(
+            model.query.options(*api.options(name, tree, fieldsets)).order_by(model.id),
+            (model.id,),
+            key=lambda row: (row.id,),
+            limit=limit,
+            after=after)
+        data = [api.serialize(name, row, tree, fieldsets) for row in page]
+        return {'data': data, 'next_cursor': page.next_cursor}
+
+    return json_response(build, api_version())
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+
+format_datetime = DateTimeFormatter(
+    locale=app.config['DATETIME_LOCALE'],
+    cache_size=app.config['DATETIME_CACHE_SIZE'])
+
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Listings.
+#----------------------------------------------------------------------------#
+
+
+# a listing is streamed if asked by the config or by the ?stream= argument
+def listing_streamed():
+    stream = request.args.get('stream')
+    if stream is None:
+        return app.config['STREAM_LISTINGS']
+    return stream.lower() in ('1', 'true', 'yes')
+
+
+# render a listing template, or stream it chunk by chunk so the first rows
+# reach the browser while the next ones are still being fetched
+def render_listing(template_name, streaming, **context):
+    if not streaming:
+        return render_template(template_name, **context)
+
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    stream = template.stream(context)
+    stream.enable_buffering(5)
+    return Response(stream_with_context(stream))
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+
+# read the limit and offset of a search page from the form or the url
+def search_page_args():
+    limit = request.values.get('limit', app.config['SEARCH_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['SEARCH_MAX_PAGE_SIZE']))
+    offset = max(0, request.values.get('offset', 0, type=int))
+    return limit, offset
+
+
+def search_response(total, data, limit, offset):
+    response = {}
+    response['count'] = total
+    response['data'] = data
+    response['limit'] = limit
+    response['offset'] = offset
+    response['next_offset'] = offset + limit if offset + limit < total else None
+    response['previous_offset'] = max(0, offset - limit) if offset > 0 else None
+    return response
+
+#----------------------------------------------------------------------------#
+# Render cache.
+#----------------------------------------------------------------------------#
+
+
+# a venue is shown on its page, in the venues listing and on the pages of
+# the artists that played or will play there
+def invalidate_venue_pages(venue_id):
+    artist_ids = db.session.query(Show.artist_id)\
+        .filter(Show.venue_id == venue_id)\
+        .distinct()
+    render_cache.invalidate(
+        ('venue', venue_id),
+        ('venues',),
+        *[('artist', artist_id) for (artist_id,) in artist_ids])
+
+
+# an artist is shown on its page, in the artists listing and on the pages
+# of the venues where the artist played or will play
+def invalidate_artist_pages(artist_id):
+    venue_ids = db.session.query(Show.venue_id)\
+        .filter(Show.artist_id == artist_id)\
+        .distinct()
+    render_cache.invalidate(
+        ('artist', artist_id),
+        ('artists',),
+        *[('venue', venue_id) for (venue_id,) in venue_ids])
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(render_cache.stats())
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -128,97 +806,148 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@render_cache.cached(lambda: [('venues',)])
 def venues():
-    venues = Venue.query.order_by(Venue.state, Venue.city).all()
-
-    # build the num_upcoming_shows attribute
-    data = []
-    for venue in venues:
-        venue_data = {
-            'id': venue.id,
-            'name': venue.name,
-            'num_upcoming_shows': len(
-                list(
-                    filter(
-                        lambda x: x.start_time > datetime.today(),
-                        venue.shows)))}
-
-        temp = {}
-        temp['city'] = venue.city
-        temp['state'] = venue.state
-        temp['venues'] = [venue_data]
-
-        print(temp)
-
-        # algorithm to merge venues that are from the same city and state
-        for d in data:
-            print(d)
-            if d['city'] == temp['city'] and d['state'] == temp['state']:
-                d['venues'].append(venue_data)
-                break
-        else:
-            data.append(temp)
-
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
+    return render_venues_listing()
+
+
+# render the venues listing, of every venue or of the venues of a genre
+def render_venues_listing(genre=None):
+    streaming = listing_streamed()
+    after, limit = page_args(
+        app.config['LISTING_PAGE_SIZE'],
+        app.config['LISTING_MAX_PAGE_SIZE'],
+        key_types=(str, str, int))
+
+    # one query returns (state, city, id, name, upcoming shows counter)
+    # already ordered by area, so the areas can be built in a single pass
+    query = db.session.query(
+        Venue.state,
+        Venue.city,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_shows_count)\
+        .order_by(Venue.state, Venue.city, Venue.id)
+    if genre is not None:
+        query = query.join(venue_genres, venue_genres.c.venue_id == Venue.id)\
+            .filter(venue_genres.c.genre_id == genre.id)
+
+    # paginate on the (state, city, id) key of the last venue of the page
+    page = KeysetPage(
+        query,
+        (Venue.state, Venue.city, Venue.id),
+        key=lambda row: row[:3],
+        limit=limit,
+        after=after,
+        batch_size=app.config['LISTING_STREAM_BATCH_SIZE'] if streaming else None)
+
+    def get_areas():
+        for (state, city), area_rows in groupby(page, key=lambda row: (row[0], row[1])):
+            yield {
+                'city': city,
+                'state': state,
+                'venues': ({
+                    'id': row[2],
+                    'name': row[3],
+                    'num_upcoming_shows': row[4]
+                } for row in area_rows)
+            }
+
+    return render_listing('pages/venues.html', streaming, areas=get_areas(), page=page)
+
+
+@app.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
-    # use ilike method to search incomplete venues
-    search_term = request.form.get('search_term')
-    venues = Venue.query.filter(
-        Venue.name.ilike(
-            '%{}%'.format(search_term))).all()
+    # ranked partial match search, served by the trigram index
+    search_term = request.values.get('search_term', '')
+    limit, offset = search_page_args()
+    total, rows = venue_search.search(search_term, limit, offset)
+
+    # read the upcoming shows counters of the whole page in one query
+    upcoming_counts = {}
+    if rows:
+        upcoming_counts = dict(
+            db.session.query(Venue.id, Venue.upcoming_shows_count)
+            .filter(Venue.id.in_([row[0] for row in rows]))
+            .all())
 
     data = []
-    for venue in venues:
+    for venue_id, name in rows:
         temp = {}
-        temp['id'] = venue.id
-        temp['name'] = venue.name
-        temp['num_upcoming_shows'] = len(venue.shows)
+        temp['id'] = venue_id
+        temp['name'] = name
+        temp['num_upcoming_shows'] = upcoming_counts.get(venue_id, 0)
         data.append(temp)
 
-    response = {}
-    response['count'] = len(data)
-    response['data'] = data
+    response = search_response(total, data, limit, offset)
 
     return render_template(
         'pages/search_venues.html',
         results=response,
-        search_term=request.form.get(
-            'search_term',
-            ''))
+        search_term=search_term)
+
+
+@app.route('/venues/nearby')
+def nearby_venues():
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    radius_km = request.args.get('radius', type=float)
+    k = request.args.get('k', app.config['NEARBY_DEFAULT_K'], type=int)
+    if latitude is None or longitude is None or not -90 <= latitude <= 90 \
+            or not -180 <= longitude <= 180 or (radius_km is not None and radius_km < 0):
+        abort(400)
+    k = max(1, min(k, app.config['NEARBY_MAX_K']))
+
+    data = [{
+        'id': venue.id,
+        'name': venue.name,
+        'city': venue.city,
+        'state': venue.state,
+        'latitude': venue.latitude,
+        'longitude': venue.longitude,
+        'distance_km': round(distance, 3)
+    } for distance, venue in venues_near(latitude, longitude, k=k, radius_km=radius_km)]
+
+    return jsonify({
+        'count': len(data),
+        'venues': data
+    })
+
+
+@app.route('/venues/<int:venue_id>/availability')
+def venue_availability(venue_id):
+    Venue.query.get_or_404(venue_id)
+    return availability_response(Show.venue_id, venue_id)
 
 
 @app.route('/venues/<int:venue_id>')
+@render_cache.cached(lambda venue_id: [('venue', venue_id)])
 def show_venue(venue_id):
     venue = Venue.query.filter_by(id=venue_id).first_or_404()
 
-    # Filter the shows between past and upcoming
-    past_shows = Show.query.join(Artist, Show.artist_id == Artist.id)\
-        .filter(Show.venue_id == venue_id)\
-        .filter(Show.start_time < datetime.now())\
-        .add_columns(Artist.id, Artist.name, Artist.image_link, Show.start_time)\
-        .all()
-    upcoming_shows = Show.query.join(Artist, Show.artist_id == Artist.id)\
-        .filter(Show.venue_id == venue_id)\
-        .filter(Show.start_time >= datetime.now())\
-        .add_columns(Artist.id, Artist.name, Artist.image_link, Show.start_time)\
-        .all()
+    # fetch the shows once and split them between past and upcoming at the
+    # same reference time
+    timeline = load_timeline(
+        db.session.query(Artist.id, Artist.name, Artist.image_link, Show.start_time)
+        .join(Show, Show.artist_id == Artist.id)
+        .filter(Show.venue_id == venue_id),
+        Show.start_time,
+        datetime.now(),
+        limit=app.config['SHOW_TIMELINE_LIMIT'])
 
-    # return a populated show dict from a show object with start_time in
-    # proper format
+    # return a populated show dict from a show row, the template formats
+    # the start_time datetime
 
     def get_show(show):
         return {
-            'artist_id': show[1],
-            'artist_name': show[2],
-            'artist_image_link': show[3],
-            'start_time': show[4].strftime('%Y-%m-%d %H:%M:%S')
+            'artist_id': show[0],
+            'artist_name': show[1],
+            'artist_image_link': show[2],
+            'start_time': show[3]
         }
 
-    past_shows = list(map(get_show, past_shows))
-    upcoming_shows = list(map(get_show, upcoming_shows))
+    past_shows = list(map(get_show, timeline.past))
+    upcoming_shows = list(map(get_show, timeline.upcoming))
 
     # populate the venue data dict that we need to send to the view
     data = {
@@ -228,7 +957,7 @@ def show_venue(venue_id):
         'state': venue.state,
         'address': venue.address,
         'phone': venue.phone,
-        'genres': venue.genres.split(','),
+        'genres': [genre.name for genre in venue.genre_list],
         'image_link': venue.image_link,
         'facebook_link': venue.facebook_link,
         'website': venue.website,
@@ -236,8 +965,8 @@ def show_venue(venue_id):
         'seeking_description': venue.seeking_description,
         'past_shows': past_shows,
         'upcoming_shows': upcoming_shows,
-        'past_shows_count': len(past_shows),
-        'upcoming_shows_count': len(upcoming_shows)
+        'past_shows_count': timeline.past_count,
+        'upcoming_shows_count': timeline.upcoming_count
     }
 
     return render_template('pages/show_venue.html', venue=data)
@@ -253,7 +982,7 @@ def create_venue_form():
     # I merged the two route so if a validate error happen all the values are not erased
     if request.method == 'GET':
         formdata = session.get('formdata', None)
-        print(formdata)
+        app.logger.debug('restoring the submitted form', extra={'formdata': formdata})
         if formdata:
             form = VenueForm(MultiDict(formdata))
             form.validate()
@@ -278,17 +1007,23 @@ def create_venue_form():
         venue.city = form_values.get('city')
         venue.state = form_values.get('state')
         venue.address = form_values.get('address')
+        set_location(
+            venue,
+            form_values.get('latitude', type=float),
+            form_values.get('longitude', type=float))
         venue.phone = form_values.get('phone')
-        venue.genres = ','.join(form_values.getlist('genres'))
+        venue.phone_e164 = normalize_phone(venue.phone, 'US') if venue.phone else None
+        set_genres(venue, form_values.getlist('genres'))
         venue.facebook_link = form_values.get('facebook_link')
         db.session.add(venue)
         db.session.commit()
+        render_cache.invalidate(('venues',))
 
     # if error we rollback the commit
     except BaseException:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not create the venue')
     finally:
         db.session.close()
 
@@ -307,68 +1042,130 @@ def create_venue_form():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit
-    # could fail.
+# delete venues and their shows in one transaction, holding the venue
+# calendars so no show is booked meanwhile, then drop their pages
+def delete_venues_response(venue_ids):
+    try:
+        with lock_calendars_of(VENUE_CALENDAR, venue_ids):
+            deleted, artist_ids = delete_venues(venue_ids)
+            db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        app.logger.exception('could not delete the venues')
+        api_error(422, 'could not delete the venues')
+    finally:
+        db.session.close()
+
+    # the bulk delete skips the mapper events keeping the search index
+    venue_search.remove(deleted)
+    render_cache.invalidate(
+        ('venues',),
+        *[('venue', venue_id) for venue_id in deleted],
+        *[('artist', artist_id) for artist_id in artist_ids])
+    return deleted
 
-    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the
-    # homepage
-    return None
+
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+    deleted = delete_venues_response([venue_id])
+    if not deleted:
+        api_error(404, 'venue {} not found'.format(venue_id))
+    return jsonify({'success': True, 'deleted': deleted})
+
+
+# batch delete, the JSON body lists the venue ids: {"venue_ids": [1, 2]}
+@app.route('/venues/delete', methods=['POST'])
+def delete_venues_batch():
+    body = request.get_json(silent=True)
+    venue_ids = body.get('venue_ids') if isinstance(body, dict) else None
+    # bool is an int subclass, but not a valid id
+    if not isinstance(venue_ids, list) \
+            or not all(type(venue_id) is int for venue_id in venue_ids) \
+            or len(venue_ids) > app.config['VENUE_DELETE_MAX_BATCH']:
+        api_error(400, 'venue_ids must be a list of at most {} ids'.format(
+            app.config['VENUE_DELETE_MAX_BATCH']))
+    return jsonify({'success': True, 'deleted': delete_venues_response(venue_ids)})
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@render_cache.cached(lambda: [('artists',)])
 def artists():
-    return render_template('pages/artists.html', artists=Artist.query.all())
-
-
-@app.route('/artists/search', methods=['POST'])
+    return render_artists_listing()
+
+
+# render the artists listing, of every artist or of the artists of a genre
+def render_artists_listing(genre=None):
+    streaming = listing_streamed()
+    after, limit = page_args(
+        app.config['LISTING_PAGE_SIZE'],
+        app.config['LISTING_MAX_PAGE_SIZE'],
+        key_types=(str, int))
+
+    # only the columns the listing needs, paginated on (name, id)
+    query = db.session.query(Artist.id, Artist.name)\
+        .order_by(Artist.name, Artist.id)
+    if genre is not None:
+        query = query.join(artist_genres, artist_genres.c.artist_id == Artist.id)\
+            .filter(artist_genres.c.genre_id == genre.id)
+    page = KeysetPage(
+        query,
+        (Artist.name, Artist.id),
+        key=lambda row: (row.name, row.id),
+        limit=limit,
+        after=after,
+        batch_size=app.config['LISTING_STREAM_BATCH_SIZE'] if streaming else None)
+
+    return render_listing('pages/artists.html', streaming, artists=page, page=page)
+
+
+@app.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-    # we use ilike to get database rows of the incomplete artist name
-    search = request.form.get('search_term')
-    data = Artist.query.filter(Artist.name.ilike("%{}%".format(search))).all()
-    response = {}
-    response['count'] = len(data)
-    response['data'] = data
+    # ranked partial match search, served by the trigram index
+    search_term = request.values.get('search_term', '')
+    limit, offset = search_page_args()
+    total, rows = artist_search.search(search_term, limit, offset)
+
+    data = [{'id': artist_id, 'name': name} for artist_id, name in rows]
+    response = search_response(total, data, limit, offset)
 
     return render_template(
         'pages/search_artists.html',
         results=response,
-        search_term=request.form.get(
-            'search_term',
-            ''))
+        search_term=search_term)
 
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+@app.route('/artists/<int:artist_id>/availability')
+def artist_availability(artist_id):
+    Artist.query.get_or_404(artist_id)
+    return availability_response(Show.artist_id, artist_id)
 
-    # filter the shows between past and upcoming shows
-    past_shows = Show.query.join(Venue, Show.venue_id == Venue.id)\
-        .filter(Show.artist_id == artist_id)\
-        .filter(Show.start_time < datetime.now())\
-        .add_columns(Venue.id, Venue.name, Venue.image_link, Show.start_time)\
-        .all()
 
-    upcoming_shows = Show.query.join(Venue, Show.venue_id == Venue.id)\
-        .filter(Show.artist_id == artist_id)\
-        .filter(Show.start_time >= datetime.now())\
-        .add_columns(Venue.id, Venue.name, Venue.image_link, Show.start_time)\
-        .all()
+@app.route('/artists/<int:artist_id>')
+@render_cache.cached(lambda artist_id: [('artist', artist_id)])
+def show_artist(artist_id):
+    artist = Artist.query.get_or_404(artist_id)
+
+    # fetch the shows once and split them between past and upcoming at the
+    # same reference time
+    timeline = load_timeline(
+        db.session.query(Venue.id, Venue.name, Venue.image_link, Show.start_time)
+        .join(Show, Show.venue_id == Venue.id)
+        .filter(Show.artist_id == artist_id),
+        Show.start_time,
+        datetime.now(),
+        limit=app.config['SHOW_TIMELINE_LIMIT'])
 
     def get_show(show):
         return {
-            'venue_id': show[1],
-            'venue_name': show[2],
-            'venue_image_link': show[3],
-            'start_time': show[4].strftime('%Y-%m-%d %H:%M:%S')
+            'venue_id': show[0],
+            'venue_name': show[1],
+            'venue_image_link': show[2],
+            'start_time': show[3]
         }
 
-    past_shows = list(map(get_show, past_shows))
-    upcoming_shows = list(map(get_show, upcoming_shows))
+    past_shows = list(map(get_show, timeline.past))
+    upcoming_shows = list(map(get_show, timeline.upcoming))
 
     data = {
         'id': artist.id,
@@ -376,7 +1173,7 @@ def show_artist(artist_id):
         'city': artist.city,
         'state': artist.state,
         'phone': artist.phone,
-        'genres': artist.genres.split(','),
+        'genres': [genre.name for genre in artist.genre_list],
         'image_link': artist.image_link,
         'facebook_link': artist.facebook_link,
         'website': artist.website,
@@ -384,8 +1181,8 @@ def show_artist(artist_id):
         'seeking_description': artist.seeking_description,
         'past_shows': past_shows,
         'upcoming_shows': upcoming_shows,
-        'past_shows_count': len(past_shows),
-        'upcoming_shows_count': len(upcoming_shows)
+        'past_shows_count': timeline.past_count,
+        'upcoming_shows_count': timeline.upcoming_count
     }
 
     return render_template('pages/show_artist.html', artist=data)
@@ -397,8 +1194,7 @@ def show_artist(artist_id):
 def edit_artist(artist_id):
     artist = Artist.query.get(artist_id)
     form = ArtistForm(obj=artist)
-
-    # How can I populate the SelectMultipleField for genres ?
+    form.genres.data = [genre.name for genre in artist.genre_list]
 
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
@@ -414,14 +1210,16 @@ def edit_artist_submission(artist_id):
         artist.city = form_values.get('city')
         artist.state = form_values.get('state')
         artist.phone = form_values.get('phone')
-        artist.genres = form_values.get('genres')
+        artist.phone_e164 = normalize_phone(artist.phone, 'US') if artist.phone else None
+        set_genres(artist, form_values.getlist('genres'))
         artist.facebook_link = form_values.get('facebook_link')
 
         db.session.commit()
+        invalidate_artist_pages(artist_id)
     except BaseException:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not update the artist')
     finally:
         db.session.close()
         if error:
@@ -434,8 +1232,7 @@ def edit_artist_submission(artist_id):
 def edit_venue(venue_id):
     venue = Venue.query.get(venue_id)
     form = VenueForm(obj=venue)
-
-    # How can I populate the SelectMultipleField for genres ?
+    form.genres.data = [genre.name for genre in venue.genre_list]
 
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
@@ -452,15 +1249,21 @@ def edit_venue_submission(venue_id):
         venue.city = form_values.get('city')
         venue.state = form_values.get('state')
         venue.address = form_values.get('address')
+        set_location(
+            venue,
+            form_values.get('latitude', type=float),
+            form_values.get('longitude', type=float))
         venue.phone = form_values.get('phone')
-        venue.genres = ','.join(form_values.getlist('genres'))
+        venue.phone_e164 = normalize_phone(venue.phone, 'US') if venue.phone else None
+        set_genres(venue, form_values.getlist('genres'))
         venue.facebook_link = form_values.get('facebook_link')
         db.session.add(venue)
         db.session.commit()
+        invalidate_venue_pages(venue_id)
     except BaseException:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not update the venue')
     finally:
         db.session.close()
         if error:
@@ -486,7 +1289,7 @@ def create_artist_form():
     # I merged the two route so if a validate error happen all the values are not erased
     if request.method == 'GET':
         formdata = session.get('formdata', None)
-        print(formdata)
+        app.logger.debug('restoring the submitted form', extra={'formdata': formdata})
         if formdata:
             form = ArtistForm(MultiDict(formdata))
             form.validate()
@@ -510,15 +1313,17 @@ def create_artist_form():
         artist.city = form_values.get('city')
         artist.state = form_values.get('state')
         artist.phone = form_values.get('phone')
-        artist.genres = ','.join(form_values.getlist('genres'))
+        artist.phone_e164 = normalize_phone(artist.phone, 'US') if artist.phone else None
+        set_genres(artist, form_values.getlist('genres'))
         artist.facebook_link = form_values.get('facebook_link')
         db.session.add(artist)
         db.session.commit()
+        render_cache.invalidate(('artists',))
     # if an eror happen we rollback the database to prevent any issue
     except BaseException:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not create the artist')
     # if an error happened while creating an Artist we flash it
     finally:
         db.session.close()
@@ -536,32 +1341,135 @@ def create_artist_form():
     return render_template('pages/home.html')
 
 
+#  Genres
+#  ----------------------------------------------------------------
+
+@app.route('/genres')
+def genres():
+    # number of venues and artists per genre, counted on the genre indexes
+    venue_counts = db.session.query(venue_genres.c.genre_id, db.func.count().label('total'))\
+        .group_by(venue_genres.c.genre_id)\
+        .subquery()
+    artist_counts = db.session.query(artist_genres.c.genre_id, db.func.count().label('total'))\
+        .group_by(artist_genres.c.genre_id)\
+        .subquery()
+    rows = db.session.query(
+        Genre.name,
+        db.func.coalesce(venue_counts.c.total, 0),
+        db.func.coalesce(artist_counts.c.total, 0))\
+        .outerjoin(venue_counts, venue_counts.c.genre_id == Genre.id)\
+        .outerjoin(artist_counts, artist_counts.c.genre_id == Genre.id)\
+        .order_by(Genre.name)\
+        .all()
+
+    data = [{
+        'name': name,
+        'num_venues': num_venues,
+        'num_artists': num_artists
+    } for name, num_venues, num_artists in rows]
+
+    return render_template('pages/genres.html', genres=data)
+
+
+@app.route('/genres/<genre_name>/venues')
+@render_cache.cached(lambda genre_name: [('venues',)])
+def venues_by_genre(genre_name):
+    genre = Genre.query.filter_by(name=genre_name).first_or_404()
+    return render_venues_listing(genre)
+
+
+@app.route('/genres/<genre_name>/artists')
+@render_cache.cached(lambda genre_name: [('artists',)])
+def artists_by_genre(genre_name):
+    genre = Genre.query.filter_by(name=genre_name).first_or_404()
+    return render_artists_listing(genre)
+
+
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
-def shows():
-    shows = Show.query.join(Venue, Show.venue_id == Venue.id)\
+# read a ?from= / ?to= date argument, abort with a 400 if it can't be parsed.
+# The show times are naive local times, a date with an offset is converted
+# to one.
+def date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        date = dateutil.parser.parse(value)
+        if date.tzinfo is not None:
+            date = date.astimezone().replace(tzinfo=None)
+        return date
+    except (ValueError, OverflowError):
+        abort(400)
+
+
+# page of the shows starting inside the [from, to) window, the window
+# defaults to the next SHOWS_WINDOW_DAYS days so only upcoming shows are read
+def upcoming_shows_page():
+    start = date_arg('from', datetime.now())
+    end = date_arg('to', start + timedelta(days=app.config['SHOWS_WINDOW_DAYS']))
+    after, limit = page_args(
+        app.config['LISTING_PAGE_SIZE'],
+        app.config['LISTING_MAX_PAGE_SIZE'],
+        # the start time is an ISO string, parsed below
+        key_types=(str, int))
+    if after is not None:
+        try:
+            after = [dateutil.parser.parse(after[0]), int(after[1])]
+        except (ValueError, TypeError, OverflowError, IndexError):
+            abort(400)
+
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Venue.id,
+        Venue.name,
+        Artist.id,
+        Artist.name,
+        Artist.image_link)\
+        .join(Venue, Show.venue_id == Venue.id)\
         .join(Artist, Show.artist_id == Artist.id)\
-        .order_by(Show.start_time)\
-        .add_columns(Venue.id, Venue.name, Artist.id, Artist.name, Artist.image_link, Show.start_time)\
-        .all()
+        .filter(Show.start_time >= start)\
+        .filter(Show.start_time < end)\
+        .order_by(Show.start_time, Show.id)
+
+    # paginate on the (start_time, id) key of the last show of the page
+    return KeysetPage(
+        query,
+        (Show.start_time, Show.id),
+        key=lambda row: (row[1], row[0]),
+        limit=limit,
+        after=after)
+
+
+def get_show(show):
+    return {
+        'venue_id': show[2],
+        'venue_name': show[3],
+        'artist_id': show[4],
+        'artist_name': show[5],
+        'artist_image_link': show[6],
+        'start_time': show[1]
+    }
 
-    data = []
-    # we display only the shows that are upcoming
 
-    for show in shows:
-        if show.start_time >= datetime.today():
-            data.append({
-                'venue_id': show[1],
-                'venue_name': show[2],
-                'artist_id': show[3],
-                'artist_name': show[4],
-                'artist_image_link': show[5],
-                'start_time': show[6].isoformat()
-            })
+@app.route('/shows')
+def shows():
+    page = upcoming_shows_page()
+    return render_template('pages/shows.html', shows=map(get_show, page), page=page)
+
 
-    return render_template('pages/shows.html', shows=data)
+@app.route('/shows.json')
+def shows_json():
+    page = upcoming_shows_page()
+    data = list(map(get_show, page))
+    for show in data:
+        show['start_time'] = show['start_time'].isoformat()
+    return jsonify({
+        'shows': data,
+        'next_cursor': page.next_cursor
+    })
 
 
 @app.route('/shows/create')
@@ -574,26 +1482,75 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     error = False
+    conflict = None
     try:
         show = Show()
-        show.artist_id = request.form['artist_id']
-        show.venue_id = request.form['venue_id']
-        show.start_time = request.form['start_time']
-        db.session.add(show)
-        db.session.commit()
+        show.artist_id = int(request.form['artist_id'])
+        show.venue_id = int(request.form['venue_id'])
+        show.start_time = dateutil.parser.parse(request.form['start_time'])
+
+        # the check and the insert hold the venue and artist calendars
+        with lock_calendars(show.venue_id, show.artist_id):
+            check_booking(show.venue_id, show.artist_id, show.start_time)
+            db.session.add(show)
+            count_new_show(show)
+            db.session.commit()
+        render_cache.invalidate(
+            ('venue', show.venue_id),
+            ('artist', show.artist_id),
+            ('venues',))
+    except BookingConflict as booking_conflict:
+        conflict = booking_conflict
+        db.session.rollback()
     except BaseException:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not create the show')
     finally:
         db.session.close()
-    if error:
+    if conflict is not None:
+        flash('The {} is already booked at that time. Requested show could not be listed.'.format(
+            'venue' if conflict.calendar == VENUE_CALENDAR else 'artist'))
+    elif error:
         flash('An error occurred. Requested show could not be listed.')
     else:
         flash('Requested show was successfully listed')
     return render_template('pages/home.html')
 
 
+#  JSON API
+#  ----------------------------------------------------------------
+
+@app.route('/api/v1/venues')
+def api_venues():
+    return api_list_response('venues')
+
+
+@app.route('/api/v1/venues/<int:venue_id>')
+def api_venue(venue_id):
+    return api_item_response('venues', venue_id)
+
+
+@app.route('/api/v1/artists')
+def api_artists():
+    return api_list_response('artists')
+
+
+@app.route('/api/v1/artists/<int:artist_id>')
+def api_artist(artist_id):
+    return api_item_response('artists', artist_id)
+
+
+@app.route('/api/v1/shows')
+def api_shows():
+    return api_list_response('shows')
+
+
+@app.route('/api/v1/shows/<int:show_id>')
+def api_show(show_id):
+    return api_item_response('shows', show_id)
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -604,15 +1561,6 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
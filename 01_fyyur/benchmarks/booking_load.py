@@ -0,0 +1,115 @@
+'''
+Concurrent load test for POST /shows/create.
+
+Several threads try to book overlapping shows at the same venue at the
+same time, then the script checks that no two accepted shows of the venue
+or of an artist overlap and reports the booking throughput.
+
+SQLite has no advisory locks, so the default run (a temporary SQLite file)
+exercises the in-process calendar locks. Point BENCH_DATABASE_URI at a
+postgres database to exercise the advisory locks across connections.
+'''
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from common import fyyur, setup_app
+
+THREADS = 8
+ATTEMPTS_PER_THREAD = 50
+# candidate start times, an hour apart, so most of them overlap
+SLOTS = 48
+
+
+def seed():
+    db = fyyur.db
+    venue = fyyur.Venue(name='Load Venue', city='Austin', state='TX',
+                        address='1 Main St', genres='Jazz')
+    artists = [fyyur.Artist(name='Load Artist {}'.format(i), city='Austin',
+                            state='TX', genres='Jazz')
+               for i in range(THREADS)]
+    db.session.add(venue)
+    db.session.add_all(artists)
+    db.session.commit()
+    return venue.id, [artist.id for artist in artists]
+
+
+def book(app, venue_id, artist_id, day, results, worker):
+    client = app.test_client()
+    attempts = 0
+    for attempt in range(ATTEMPTS_PER_THREAD):
+        start_time = day + timedelta(hours=(attempt * 7 + worker) % SLOTS)
+        client.post('/shows/create', data={
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start_time.isoformat()
+        })
+        attempts += 1
+    results[worker] = attempts
+
+
+def overlaps(start_times, duration):
+    start_times = sorted(start_times)
+    return [(a, b) for a, b in zip(start_times, start_times[1:]) if b - a < duration]
+
+
+def main():
+    database_uri = os.environ.get('BENCH_DATABASE_URI')
+    directory = None
+    if database_uri is None:
+        directory = tempfile.TemporaryDirectory()
+        database_uri = 'sqlite:///' + os.path.join(directory.name, 'booking.db')
+
+    app = setup_app(database_uri)
+    with app.app_context():
+        venue_id, artist_ids = seed()
+
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=7)
+    results = {}
+    threads = [threading.Thread(target=book,
+                                args=(app, venue_id, artist_id, day, results, worker))
+               for worker, artist_id in enumerate(artist_ids)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    attempts = sum(results.values())
+    with app.app_context():
+        shows = fyyur.Show.query.filter_by(venue_id=venue_id).all()
+        duration = fyyur.show_duration()
+        venue_overlaps = overlaps([show.start_time for show in shows], duration)
+        artist_overlaps = []
+        for artist_id in artist_ids:
+            artist_overlaps += overlaps(
+                [show.start_time for show in shows if show.artist_id == artist_id], duration)
+        venue = fyyur.Venue.query.get(venue_id)
+        counted = venue.upcoming_shows_count
+
+    print('{} threads, {} booking attempts in {:.2f}s ({:.0f} req/s)'.format(
+        THREADS, attempts, elapsed, attempts / elapsed))
+    print('{} shows accepted, {} rejected'.format(len(shows), attempts - len(shows)))
+
+    failed = False
+    if venue_overlaps or artist_overlaps:
+        print('FAIL: {} overlapping shows'.format(len(venue_overlaps) + len(artist_overlaps)))
+        failed = True
+    if counted != len(shows):
+        print('FAIL: venue counts {} upcoming shows, {} were booked'.format(counted, len(shows)))
+        failed = True
+
+    if directory is not None:
+        directory.cleanup()
+    if failed:
+        sys.exit(1)
+    print('OK: no overlapping bookings')
+
+
+if __name__ == '__main__':
+    main()
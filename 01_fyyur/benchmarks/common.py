@@ -0,0 +1,52 @@
+'''
+Shared helpers for the Fyyur benchmark scripts.
+
+The scripts run against an in-memory SQLite database by default so they can
+be executed without a local postgres server:
+
+    $ python benchmarks/venues_query_count.py
+
+Set BENCH_DATABASE_URI to run them against a real database instead.
+'''
+import os
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# make the fyyur modules importable when a script is run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as fyyur  # noqa: E402
+
+
+def setup_app(database_uri=None):
+    '''Point the fyyur app at the benchmark database and create the tables.'''
+    database_uri = database_uri or os.environ.get('BENCH_DATABASE_URI', 'sqlite://')
+    fyyur.app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    fyyur.app.config['SQLALCHEMY_ENGINE_OPTIONS'] = fyyur.engine_options(database_uri)
+    fyyur.app.config['TESTING'] = True
+    fyyur.app.config['WTF_CSRF_ENABLED'] = False
+    # measure the queries, not the render cache nor the request log
+    fyyur.render_cache.enabled = False
+    fyyur.app.config['LOG_REQUESTS'] = False
+    with fyyur.app.app_context():
+        fyyur.db.drop_all()
+        fyyur.db.create_all()
+    return fyyur.app
+
+
+@contextmanager
+def count_queries():
+    '''Count every statement sent to the database inside the block.'''
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = fyyur.db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
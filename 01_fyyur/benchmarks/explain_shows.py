@@ -0,0 +1,139 @@
+'''
+EXPLAIN ANALYZE report of the show access paths, before and after the
+shows indexes.
+
+Seeds venues, artists and (by default) a million shows spread over twenty
+years, then prints the query plans of the venue page, the artist page and
+the upcoming /shows listing without and with the indexes of the Show model:
+
+    $ BENCH_DATABASE_URI=postgresql://localhost/fyyur_bench \
+        python benchmarks/explain_shows.py --shows 1000000
+
+On SQLite the plans come from EXPLAIN QUERY PLAN, which doesn't time them.
+'''
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from common import fyyur, setup_app
+
+SEED_SQL = {
+    'postgresql': [
+        '''INSERT INTO venues (name, city, state, address, genres)
+           SELECT 'Venue ' || n, 'City ' || (n % 100), 'CA', n || ' Main St', 'Jazz'
+           FROM generate_series(1, :venues) AS n''',
+        '''INSERT INTO artists (name, city, state, genres)
+           SELECT 'Artist ' || n, 'City ' || (n % 100), 'CA', 'Jazz'
+           FROM generate_series(1, :artists) AS n''',
+        '''INSERT INTO shows (start_time, artist_id, venue_id)
+           SELECT now() + (random() * 7300 - 3650) * interval '1 day',
+                  1 + (n % :artists), 1 + ((n * 7) % :venues)
+           FROM generate_series(1, :shows) AS n''',
+    ],
+    'sqlite': [
+        '''WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :venues)
+           INSERT INTO venues (name, city, state, address, genres)
+           SELECT 'Venue ' || n, 'City ' || (n % 100), 'CA', n || ' Main St', 'Jazz' FROM seq''',
+        '''WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :artists)
+           INSERT INTO artists (name, city, state, genres)
+           SELECT 'Artist ' || n, 'City ' || (n % 100), 'CA', 'Jazz' FROM seq''',
+        '''WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :shows)
+           INSERT INTO shows (start_time, artist_id, venue_id)
+           SELECT datetime('now', printf('%+d minutes', abs(random()) % 10512000 - 5256000)),
+                  1 + (n % :artists), 1 + ((n * 7) % :venues)
+           FROM seq''',
+    ],
+}
+
+QUERIES = [
+    ('venue page timeline', '''
+        SELECT artists.id, artists.name, artists.image_link, shows.start_time
+        FROM artists JOIN shows ON shows.artist_id = artists.id
+        WHERE shows.venue_id = :venue_id
+        ORDER BY shows.start_time'''),
+    ('artist page timeline', '''
+        SELECT venues.id, venues.name, venues.image_link, shows.start_time
+        FROM venues JOIN shows ON shows.venue_id = venues.id
+        WHERE shows.artist_id = :artist_id
+        ORDER BY shows.start_time'''),
+    ('upcoming /shows listing', '''
+        SELECT venues.id, venues.name, artists.id, artists.name, shows.start_time
+        FROM shows
+        JOIN venues ON shows.venue_id = venues.id
+        JOIN artists ON shows.artist_id = artists.id
+        WHERE shows.start_time >= :now
+        ORDER BY shows.start_time
+        LIMIT 100'''),
+]
+
+
+def seed(connection, dialect, counts):
+    for statement in SEED_SQL[dialect]:
+        connection.execute(text(statement), **counts)
+    connection.execute(text('ANALYZE'))
+
+
+def explain(connection, dialect, params):
+    prefix = 'EXPLAIN ANALYZE' if dialect == 'postgresql' else 'EXPLAIN QUERY PLAN'
+    report = []
+    for title, sql in QUERIES:
+        rows = connection.execute(text('{} {}'.format(prefix, sql)), **params)
+        # postgres returns one plan line per row, sqlite the detail last
+        lines = [str(row[-1]) for row in rows]
+        report.append((title, lines))
+    return report
+
+
+def print_report(label, report):
+    print('=' * 78)
+    print(label)
+    print('=' * 78)
+    for title, lines in report:
+        print('-- {}'.format(title))
+        for line in lines:
+            print('   {}'.format(line))
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = setup_app()
+    with app.app_context():
+        engine = fyyur.db.engine
+        dialect = engine.dialect.name
+        if dialect not in SEED_SQL:
+            parser.error('unsupported database: {}'.format(dialect))
+
+        counts = {'venues': args.venues, 'artists': args.artists, 'shows': args.shows}
+        params = {'venue_id': 1, 'artist_id': 1, 'now': datetime.now()}
+        indexes = list(fyyur.Show.__table__.indexes)
+
+        with engine.begin() as connection:
+            start = time.perf_counter()
+            seed(connection, dialect, counts)
+            print('seeded {shows} shows in {:.1f}s'.format(
+                time.perf_counter() - start, **counts))
+
+        with engine.begin() as connection:
+            for index in indexes:
+                index.drop(bind=connection)
+            connection.execute(text('ANALYZE'))
+            print_report('BEFORE: no shows indexes', explain(connection, dialect, params))
+
+        with engine.begin() as connection:
+            for index in indexes:
+                index.create(bind=connection)
+            connection.execute(text('ANALYZE'))
+            print_report('AFTER: {}'.format(', '.join(index.name for index in indexes)),
+                         explain(connection, dialect, params))
+
+
+if __name__ == '__main__':
+    main()
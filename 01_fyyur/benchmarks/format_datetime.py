@@ -0,0 +1,71 @@
+'''
+Micro-benchmark of the datetime template filter.
+
+Formats the start times of a page of shows, like /shows or a venue page
+does, with the previous filter (dateutil parse of a string then
+babel.dates.format_datetime) and with formatting.DateTimeFormatter, and
+prints the rows formatted per second of each.
+'''
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatting import DateTimeFormatter  # noqa: E402
+
+ROWS = 500
+REPEAT = 20
+
+
+# the filter as it was before DateTimeFormatter
+def previous_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main():
+    start = datetime(2020, 5, 21, 21, 30)
+    # a page of shows, some of them at the same time
+    times = [start + timedelta(hours=3 * (i % 200)) for i in range(ROWS)]
+    strings = [time.strftime('%Y-%m-%d %H:%M:%S') for time in times]
+
+    formatter = DateTimeFormatter()
+    assert formatter(times[0], 'full') == previous_format_datetime(strings[0], 'full')
+
+    def previous_filter():
+        return [previous_format_datetime(value, 'full') for value in strings]
+
+    def cold_strings():
+        cold = DateTimeFormatter()
+        return [cold(value, 'full') for value in strings]
+
+    def cold_datetimes():
+        cold = DateTimeFormatter()
+        return [cold(value, 'full') for value in times]
+
+    def warm_datetimes():
+        return [formatter(value, 'full') for value in times]
+
+    cases = [
+        ('previous filter, strings', previous_filter),
+        ('formatter, strings, cold cache', cold_strings),
+        ('formatter, datetimes, cold cache', cold_datetimes),
+        ('formatter, datetimes, warm cache', warm_datetimes),
+    ]
+
+    for title, run in cases:
+        elapsed = min(timeit.repeat(run, number=1, repeat=REPEAT))
+        print('{:<34} {:>12,.0f} rows/s'.format(title, ROWS / elapsed))
+
+
+if __name__ == '__main__':
+    main()
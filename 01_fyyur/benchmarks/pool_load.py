@@ -0,0 +1,102 @@
+'''
+Load test of the connection pool sizes.
+
+Runs the same threaded load (GET /venues/<id> and GET /api/v1/venues) once
+per pool size, each in its own process configured by the DB_POOL_SIZE
+environment variable, and reports the throughput and the time requests
+waited for a connection:
+
+    $ BENCH_DATABASE_URI=postgresql://localhost/fyyur_bench python benchmarks/pool_load.py
+
+Without BENCH_DATABASE_URI a temporary SQLite file is used, which shows the
+pool waits but not the behaviour of a real database server.
+'''
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+POOL_SIZES = (1, 2, 4, 8, 16)
+THREADS = 16
+DURATION = 3.0
+VENUES = 50
+
+
+def seed():
+    from common import fyyur
+    db = fyyur.db
+    for i in range(VENUES):
+        db.session.add(fyyur.Venue(name='Venue {}'.format(i), city='Austin', state='TX',
+                                   address='{} Main St'.format(i), genres='Jazz'))
+    db.session.commit()
+
+
+# child process: run the load with the pool configured by the environment
+def run_load():
+    from common import fyyur, setup_app
+    app = setup_app()
+    with app.app_context():
+        seed()
+
+    counts = [0] * THREADS
+    deadline = time.perf_counter() + DURATION
+
+    def worker(index):
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            client.get('/venues/{}'.format(counts[index] % VENUES + 1))
+            client.get('/api/v1/venues?limit=20')
+            counts[index] += 2
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        pool = fyyur.db.engine.pool
+    waits = pool.checkout_wait.series.get((), [0] * len(pool.checkout_wait.buckets) + [0, 0.0])
+    print(json.dumps({
+        'requests': sum(counts),
+        'throughput': sum(counts) / elapsed,
+        'checkouts': waits[-2],
+        'mean_wait_ms': waits[-1] / waits[-2] * 1000 if waits[-2] else 0,
+        'timeouts': pool.checkout_timeouts
+    }))
+
+
+def main():
+    directory = None
+    environ = dict(os.environ)
+    if 'BENCH_DATABASE_URI' not in environ:
+        directory = tempfile.TemporaryDirectory()
+        environ['BENCH_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory.name, 'pool.db')
+
+    print('{} threads for {:.0f}s per pool size'.format(THREADS, DURATION))
+    print('{:>9} {:>10} {:>10} {:>14} {:>9}'.format(
+        'pool size', 'requests', 'req/s', 'mean wait ms', 'timeouts'))
+    for pool_size in POOL_SIZES:
+        environ.update(DB_POOL_SIZE=str(pool_size), DB_MAX_OVERFLOW='0')
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child'],
+            env=environ, check=True, stdout=subprocess.PIPE).stdout
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        print('{:>9} {:>10} {:>10.0f} {:>14.3f} {:>9}'.format(
+            pool_size, result['requests'], result['throughput'],
+            result['mean_wait_ms'], result['timeouts']))
+
+    if directory is not None:
+        directory.cleanup()
+
+
+if __name__ == '__main__':
+    if '--child' in sys.argv:
+        run_load()
+    else:
+        main()
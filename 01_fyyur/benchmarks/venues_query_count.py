@@ -0,0 +1,76 @@
+'''
+Regression benchmark for GET /venues.
+
+Seeds a growing number of venues (each with past and upcoming shows) and
+checks that the number of SQL statements issued by the listing stays the
+same whatever the number of venues is.
+'''
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import fyyur, setup_app, count_queries
+
+VENUE_COUNTS = (10, 100, 1000)
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX')]
+
+
+def seed(venue_count):
+    db = fyyur.db
+    db.drop_all()
+    db.create_all()
+
+    artist = fyyur.Artist(name='Bench Artist', city='Austin', state='TX',
+                          genres='Jazz')
+    db.session.add(artist)
+    db.session.flush()
+
+    now = datetime.now()
+    venues = []
+    for i in range(venue_count):
+        city, state = CITIES[i % len(CITIES)]
+        venues.append(fyyur.Venue(name='Venue {}'.format(i), city=city,
+                                  state=state, address='{} Main St'.format(i),
+                                  genres='Jazz'))
+    db.session.add_all(venues)
+    db.session.flush()
+
+    shows = []
+    for venue in venues:
+        shows.append(fyyur.Show(artist_id=artist.id, venue_id=venue.id,
+                                start_time=now - timedelta(days=30)))
+        shows.append(fyyur.Show(artist_id=artist.id, venue_id=venue.id,
+                                start_time=now + timedelta(days=30)))
+    db.session.add_all(shows)
+    db.session.commit()
+
+
+def main():
+    app = setup_app()
+    client = app.test_client()
+    query_counts = []
+
+    for venue_count in VENUE_COUNTS:
+        with app.app_context():
+            seed(venue_count)
+
+        with count_queries() as statements:
+            start = time.perf_counter()
+            response = client.get('/venues?limit={}'.format(venue_count))
+            elapsed = time.perf_counter() - start
+
+        assert response.status_code == 200, response.status_code
+        query_counts.append(len(statements))
+        print('{:>6} venues: {:>3} queries, {:8.2f} ms'.format(
+            venue_count, len(statements), elapsed * 1000))
+
+    if len(set(query_counts)) != 1:
+        print('FAIL: query count grows with the number of venues')
+        return 1
+
+    print('OK: constant query count')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import bisect
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+# namespaces of the calendar locks
+VENUE_CALENDAR = 1
+ARTIST_CALENDAR = 2
+
+
+class BookingConflict(Exception):
+    '''A show overlaps another show of the same venue or artist.'''
+
+    def __init__(self, calendar, show_ids):
+        super().__init__(calendar, show_ids)
+        self.calendar = calendar
+        self.show_ids = show_ids
+
+
+class CalendarLocks:
+    '''
+    Serialize the bookings of a venue or an artist, so two concurrent
+    submissions can't both see a free slot and both book it.
+
+    On postgres it takes transaction level advisory locks, released by the
+    commit or the rollback, so it holds across the workers. Elsewhere it
+    falls back to process level locks held for the duration of the block.
+    '''
+
+    def __init__(self):
+        self.locks = defaultdict(threading.Lock)
+        self.guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, session, keys):
+        # always lock in the same order to avoid deadlocks
+        keys = sorted(set(keys))
+
+        if session.get_bind().dialect.name == 'postgresql':
+            for namespace, entity_id in keys:
+                session.execute(
+                    text('SELECT pg_advisory_xact_lock(:namespace, :entity_id)'),
+                    {'namespace': namespace, 'entity_id': entity_id})
+            yield
+            return
+
+        with self.guard:
+            locks = [self.locks[key] for key in keys]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+
+class BookedCalendars:
+    '''
+    Sorted start times of the shows of venues and artists, to check many
+    bookings in memory with the rule of the booking checks: two shows of a
+    calendar can't start less than `duration` apart.
+    '''
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.starts = defaultdict(list)
+
+    def book(self, venue_id, artist_id, start_time):
+        for key in ((VENUE_CALENDAR, venue_id), (ARTIST_CALENDAR, artist_id)):
+            bisect.insort(self.starts[key], start_time)
+
+    # the calendar a show at start_time would overlap, None if both are free
+    def conflict(self, venue_id, artist_id, start_time):
+        for key in ((VENUE_CALENDAR, venue_id), (ARTIST_CALENDAR, artist_id)):
+            starts = self.starts.get(key, [])
+            index = bisect.bisect_left(starts, start_time)
+            if index < len(starts) and starts[index] - start_time < self.duration:
+                return key[0]
+            if index > 0 and start_time - starts[index - 1] < self.duration:
+                return key[0]
+        return None
+
+
+# return the free (start, end) intervals of a calendar between start and
+# end, that can hold a show of `duration`. `busy` are the sorted start
+# times of the shows that can overlap the range (from start - duration)
+def free_slots(busy, start, end, duration):
+    slots = []
+    cursor = start
+    for show_start in busy:
+        if show_start - cursor >= duration:
+            slots.append((cursor, min(show_start, end)))
+        cursor = max(cursor, show_start + duration)
+        if cursor >= end:
+            return slots
+    if end - cursor >= duration:
+        slots.append((cursor, end))
+    return slots
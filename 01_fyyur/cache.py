@@ -0,0 +1,157 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, Counter
+from functools import wraps
+
+from flask import request, session, g
+from werkzeug.utils import import_string
+
+
+class LRUCache:
+    '''
+    Bounded in-process cache, the least recently used keys are evicted first.
+
+    It has the get / set / delete interface of the cachelib caches so a
+    shared backend (redis, memcached) can be used instead.
+    '''
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                self.items.move_to_end(key)
+            except KeyError:
+                return None
+            return self.items[key]
+
+    def set(self, key, value, timeout=None):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+        return True
+
+    def delete(self, key):
+        with self.lock:
+            return self.items.pop(key, None) is not None
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+        return True
+
+
+class RenderCache:
+    '''
+    Cache of rendered pages, keyed by view, view arguments, tags, a "now"
+    bucket and the query string.
+
+    A tag is a tuple naming what the page is built from, like ('venue', 3)
+    or ('venues',). Each tag has a random version stored in the backend and
+    part of the key: invalidating a tag gives it a new version, so every
+    page built from it is missed without having to find and delete them.
+    The "now" bucket changes every `bucket_seconds` so the past / upcoming
+    split of the shows is refreshed. Pages read from a replica are kept
+    `replica_timeout` seconds at most, as they can miss the last writes.
+    '''
+
+    def __init__(self, backend=None, bucket_seconds=60, timeout=None):
+        self.backend = backend if backend is not None else LRUCache()
+        self.bucket_seconds = bucket_seconds
+        self.timeout = timeout
+        self.replica_timeout = 10
+        self.enabled = True
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        # RENDER_CACHE_BACKEND is the import path of a shared cache class
+        # (like cachelib.RedisCache), built with RENDER_CACHE_BACKEND_OPTIONS
+        backend = app.config.get('RENDER_CACHE_BACKEND')
+        if backend:
+            self.backend = import_string(backend)(
+                **app.config.get('RENDER_CACHE_BACKEND_OPTIONS', {}))
+        else:
+            self.backend = LRUCache(app.config.get('RENDER_CACHE_SIZE', 1024))
+        self.enabled = app.config.get('RENDER_CACHE_ENABLED', True)
+        self.bucket_seconds = app.config.get('RENDER_CACHE_BUCKET_SECONDS', self.bucket_seconds)
+        self.timeout = app.config.get('RENDER_CACHE_TIMEOUT', self.timeout)
+        self.replica_timeout = app.config.get('RENDER_CACHE_REPLICA_TIMEOUT', self.replica_timeout)
+
+    def _count(self, name, namespace):
+        with self.lock:
+            self.counters[name] += 1
+            self.counters['{}.{}'.format(name, namespace)] += 1
+
+    def _tag_version(self, tag):
+        tag_key = 'tag:' + ':'.join(map(str, tag))
+        version = self.backend.get(tag_key)
+        if version is None:
+            # a missing version (new or evicted tag) is replaced by a new one
+            # so pages rendered with the evicted version can't come back
+            version = uuid.uuid4().hex
+            self.backend.set(tag_key, version, timeout=None)
+        return version
+
+    # version of what is built from the tags: the versions of the tags and
+    # the "now" bucket
+    def version(self, tags):
+        versions = '.'.join(self._tag_version(tag) for tag in tags)
+        return '{}:{}'.format(versions, int(time.time() // self.bucket_seconds))
+
+    def key(self, namespace, tags):
+        # the tags don't always name the arguments, like the genre of the
+        # /genres/<genre_name>/venues listing
+        view_args = '&'.join('{}={}'.format(name, value)
+                             for name, value in sorted((request.view_args or {}).items()))
+        return 'render:{}:{}:{}:{}'.format(
+            namespace, view_args, self.version(tags), request.query_string.decode('utf-8'))
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.set('tag:' + ':'.join(map(str, tag)), uuid.uuid4().hex, timeout=None)
+            self._count('invalidations', tag[0])
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    # cache the page returned by a view, `tags` maps the view arguments to
+    # the tags the page is built from
+    def cached(self, tags):
+        def decorator(view):
+            namespace = view.__name__
+
+            @wraps(view)
+            def wrapper(**kwargs):
+                # pages showing flashed messages are never cached nor served
+                # from the cache
+                if not self.enabled or request.method != 'GET' or session.get('_flashes'):
+                    return view(**kwargs)
+
+                key = self.key(namespace, tags(**kwargs))
+                page = self.backend.get(key)
+                if page is not None:
+                    self._count('hits', namespace)
+                    return page
+
+                self._count('misses', namespace)
+                page = view(**kwargs)
+                # only fully rendered pages are cached, not streamed
+                # responses, redirects or errors
+                if isinstance(page, str):
+                    timeout = self.timeout
+                    if g.get('db_replica') is not None:
+                        timeout = min(timeout or self.replica_timeout, self.replica_timeout)
+                    self.backend.set(key, page, timeout=timeout)
+                return page
+
+            return wrapper
+
+        return decorator
@@ -6,8 +6,82 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # Enable debug mode.
 DEBUG = True
 
-# Connect to the database
-SQLALCHEMY_DATABASE_URI = 'postgres://mattioo@localhost:5432/fyyur'
+# Connect to the database, the pool is configured by the DB_POOL_*
+# environment variables (see db_pool.engine_options)
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres://mattioo@localhost:5432/fyyur')
+
+# Read replicas serving the GET requests (comma separated DATABASE_REPLICA_URLS),
+# a client reads from the primary for REPLICA_STICKY_SECONDS after a write
+SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+REPLICA_STICKY_SECONDS = 10
 
 # Disable track modifications option
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Keyset pagination of the venue and artist listings
+LISTING_PAGE_SIZE = 100
+LISTING_MAX_PAGE_SIZE = 1000
+
+# Stream the listing templates to the client while rows are fetched
+# (can also be asked per request with ?stream=1)
+STREAM_LISTINGS = False
+LISTING_STREAM_BATCH_SIZE = 50
+
+# Page size of the venue and artist search results
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Maximum number of past and upcoming shows listed on a venue or artist page
+# (None lists all of them)
+SHOW_TIMELINE_LIMIT = None
+
+# Default time window of the upcoming /shows listing
+SHOWS_WINDOW_DAYS = 90
+
+# Render cache of the venue and artist pages and listings. The in-process
+# LRU cache is used unless RENDER_CACHE_BACKEND names a shared cache class
+# (e.g. 'cachelib.RedisCache') built with RENDER_CACHE_BACKEND_OPTIONS
+RENDER_CACHE_ENABLED = True
+RENDER_CACHE_SIZE = 1024
+RENDER_CACHE_BUCKET_SECONDS = 60
+RENDER_CACHE_TIMEOUT = 300
+# pages read from a replica may miss the last writes, keep them shorter
+RENDER_CACHE_REPLICA_TIMEOUT = 10
+RENDER_CACHE_BACKEND = None
+RENDER_CACHE_BACKEND_OPTIONS = {}
+
+# Locale of the datetime template filter (None for the LC_TIME of the
+# environment) and number of formatted datetimes it memoizes
+DATETIME_LOCALE = None
+DATETIME_CACHE_SIZE = 4096
+
+# Number of venues returned by /venues/nearby
+NEARBY_DEFAULT_K = 10
+NEARBY_MAX_K = 100
+
+# Length of a show, two shows of a venue or an artist can't overlap
+SHOW_DURATION_MINUTES = 180
+
+# Default and maximum range of the /availability calendars
+AVAILABILITY_WINDOW_DAYS = 30
+AVAILABILITY_MAX_DAYS = 366
+
+# Request metrics served in the Prometheus format, None to disable the endpoint
+METRICS_ENDPOINT = '/metrics'
+
+# Maximum number of SQL statements of a request, for every route
+# (QUERY_BUDGET) or by route rule (QUERY_BUDGETS, like {'/venues': 3}).
+# A request over its budget fails with QueryBudgetExceeded, None disables it
+QUERY_BUDGET = None
+QUERY_BUDGETS = {}
+
+# Logging, JSON lines written by a background thread to LOG_FILE (stderr if
+# None). LOG_SAMPLE_RATE is the share of the requests whose info and debug
+# records are kept, warnings and errors are always kept
+LOG_LEVEL = 'INFO'
+LOG_FILE = 'error.log'
+LOG_SAMPLE_RATE = 1.0
+LOG_REQUESTS = True
+
+# Maximum number of venues deleted by one POST /venues/delete
+VENUE_DELETE_MAX_BATCH = 1000
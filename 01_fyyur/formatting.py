@@ -0,0 +1,58 @@
+from datetime import date, datetime
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+from cache import LRUCache
+
+# named formats of the datetime filter, any other format is used as a babel
+# pattern
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+class DateTimeFormatter:
+    '''
+    Jinja filter formatting datetimes with babel.
+
+    datetime objects are formatted as they are, strings are parsed once.
+    The babel patterns and locales are parsed ahead and the formatted values
+    are memoized per (value, format, locale) in a bounded LRU cache.
+    '''
+
+    def __init__(self, locale=None, cache_size=4096):
+        self.locale = locale or babel.dates.LC_TIME
+        self.cache = LRUCache(cache_size)
+        self.patterns = {}
+        self.locales = {}
+        for format in DATETIME_FORMATS:
+            self.pattern(format)
+        self.get_locale(self.locale)
+
+    def pattern(self, format):
+        pattern = self.patterns.get(format)
+        if pattern is None:
+            pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+            self.patterns[format] = pattern
+        return pattern
+
+    def get_locale(self, locale):
+        parsed = self.locales.get(locale)
+        if parsed is None:
+            parsed = Locale.parse(locale)
+            self.locales[locale] = parsed
+        return parsed
+
+    def __call__(self, value, format='medium', locale=None):
+        locale = locale or self.locale
+        key = (value, format, locale)
+        formatted = self.cache.get(key)
+        if formatted is None:
+            if not isinstance(value, (datetime, date)):
+                value = dateutil.parser.parse(value)
+            formatted = self.pattern(format).apply(value, self.get_locale(locale))
+            self.cache.set(key, formatted)
+        return formatted
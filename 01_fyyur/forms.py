@@ -1,18 +1,70 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
-from wtforms.validators import ValidationError, Optional, DataRequired, AnyOf, URL, Length
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, FloatField
+from wtforms.validators import ValidationError, Optional, DataRequired, AnyOf, URL, Length, NumberRange
 import phonenumbers
 
+from cache import LRUCache
 
-# function that use the library phonenumbers to validate a phone number
+# normalized phone numbers by (number, region), '' for an invalid number
+PHONE_CACHE = LRUCache(maxsize=100000)
+
+
+# parse a phone number with the library phonenumbers, return its E.164
+# form or '' if it isn't a valid number
+def parse_phone(number_and_region):
+    number, region = number_and_region
+    try:
+        input_number = phonenumbers.parse(number, region)
+        if not (phonenumbers.is_valid_number(input_number)):
+            return ''
+        return phonenumbers.format_number(
+            input_number, phonenumbers.PhoneNumberFormat.E164)
+    except Exception:
+        return ''
+
+
+# E.164 form of a phone number, None if it isn't valid. The results are
+# memoized so a number is only parsed once
+def normalize_phone(number, region=None):
+    key = (number, region)
+    e164 = PHONE_CACHE.get(key)
+    if e164 is None:
+        e164 = parse_phone(key)
+        PHONE_CACHE.set(key, e164)
+    return e164 or None
+
+
+# E.164 forms of a list of phone numbers, None for the invalid ones. The
+# numbers that aren't memoized yet are parsed once each, across the
+# processes of `pool` (a concurrent.futures executor) if given
+def normalize_phones(numbers, region=None, pool=None):
+    results = {}
+    missing = []
+    for number in set(numbers):
+        e164 = PHONE_CACHE.get((number, region))
+        if e164 is None:
+            missing.append((number, region))
+        else:
+            results[number] = e164
+
+    if missing:
+        if pool is not None:
+            chunksize = max(1, len(missing) // 64)
+            parsed = list(pool.map(parse_phone, missing, chunksize=chunksize))
+        else:
+            parsed = list(map(parse_phone, missing))
+        for key, e164 in zip(missing, parsed):
+            PHONE_CACHE.set(key, e164)
+            results[key[0]] = e164
+
+    return [results[number] or None for number in numbers]
+
+
+# validator that use the library phonenumbers to validate a phone number
 def validate_phone(message='Invalid phone number.', region=None):
     def _validate_phone(form, field):
-        try:
-            input_number = phonenumbers.parse(field.data, region)
-            if not (phonenumbers.is_valid_number(input_number)):
-                raise ValidationError(message)
-        except BaseException:
+        if normalize_phone(field.data, region) is None:
             raise ValidationError(message)
 
     return _validate_phone
@@ -98,6 +150,12 @@ class VenueForm(FlaskForm):
     address = StringField(
         'address', validators=[DataRequired()]
     )
+    latitude = FloatField(
+        'latitude', validators=[Optional(), NumberRange(-90, 90)]
+    )
+    longitude = FloatField(
+        'longitude', validators=[Optional(), NumberRange(-180, 180)]
+    )
     phone = StringField(
         'phone', validators=[validate_phone(region='US'), Optional()]
     )
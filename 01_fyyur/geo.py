@@ -0,0 +1,102 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# precision of the geohash stored for each venue
+GEOHASH_PRECISION = 12
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        value, interval = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+# return the (south, north, west, east) bounds of a geohash cell
+def geohash_bounds(geohash):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if bits >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+# return the cell of a point and its (up to) 8 neighbours at a precision
+def geohash_block(latitude, longitude, precision):
+    center = encode_geohash(latitude, longitude, precision)
+    south, north, west, east = geohash_bounds(center)
+    lat_span = north - south
+    lon_span = east - west
+    lat = (south + north) / 2
+    lon = (west + east) / 2
+
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        neighbour_lat = lat + lat_step * lat_span
+        if not -90 < neighbour_lat < 90:
+            continue
+        for lon_step in (-1, 0, 1):
+            neighbour_lon = (lon + lon_step * lon_span + 180) % 360 - 180
+            cells.add(encode_geohash(neighbour_lat, neighbour_lon, precision))
+    return cells
+
+
+# distance from a point that the 3x3 block of cells around it is sure to
+# cover in every direction: one cell height or width
+def block_coverage_km(latitude, precision):
+    lat_bits = precision * 5 // 2
+    lon_bits = precision * 5 - lat_bits
+    lat_span = 180.0 / 2 ** lat_bits
+    lon_span = 360.0 / 2 ** lon_bits
+    farthest_lat = min(90.0, abs(latitude) + 2 * lat_span)
+    return min(lat_span * KM_PER_DEGREE,
+               lon_span * KM_PER_DEGREE * math.cos(math.radians(farthest_lat)))
+
+
+# largest precision whose block covers a radius, 0 if no block does
+def precision_for_radius(latitude, radius_km):
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if block_coverage_km(latitude, precision) >= radius_km:
+            return precision
+    return 0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,394 @@
+'''
+Bulk import of venues, artists and shows from CSV or NDJSON files.
+
+    $ python import_data.py venues partner_venues.csv
+    $ python import_data.py artists partner_artists.ndjson --batch-size 5000
+    $ python import_data.py shows partner_shows.csv --rejects rejects.ndjson
+
+The file is streamed: every row is validated with the rules of VenueForm,
+ArtistForm or ShowForm and the valid rows are written by batches, one
+transaction per batch, with COPY on postgres and executemany elsewhere.
+Shows reference their venue and artist by venue_id / artist_id or by
+venue_name / artist_name, resolved in memory. The rejected rows are
+reported with their line number and errors, like the shows that would
+overlap a show of their venue or artist.
+'''
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+from werkzeug.datastructures import MultiDict
+
+from app import app, db, Venue, Artist, Show, ShowCounterState, render_cache, \
+    venue_search, artist_search, venue_genres, artist_genres, genres_by_name, link_genres, \
+    lock_calendars_of_bookings, check_bookings
+from booking import VENUE_CALENDAR
+from geo import encode_geohash
+from forms import VenueForm, ArtistForm, ShowForm, normalize_phone, normalize_phones
+
+
+# yield (line number, row dict) from a csv file with a header line
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+# yield (line number, row dict) from a newline delimited json file
+def read_ndjson(stream):
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row
+
+
+# build the form data of a row, the genres can be a list or a comma
+# separated string
+def form_data(row):
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None or value == '':
+            continue
+        if key == 'genres':
+            genres = value if isinstance(value, list) else value.split(',')
+            for genre in genres:
+                data.add(key, genre.strip())
+        else:
+            data.add(key, str(value))
+    return data
+
+
+class Importer:
+    '''Validate the rows of one model and write them by batches.'''
+
+    form_class = None
+    model = None
+    fields = ()
+
+    def __init__(self):
+        self.columns = list(self.fields)
+        if 'phone' in self.fields:
+            self.columns.append('phone_e164')
+
+    def validate(self, row):
+        form = self.form_class(formdata=form_data(row), meta={'csrf': False})
+        if not form.validate():
+            return None, form.errors
+        return self.values(form), None
+
+    def values(self, form):
+        values = {}
+        for field in self.fields:
+            value = form[field].data
+            if field == 'genres':
+                value = ','.join(value)
+            values[field] = value if value != '' else None
+        if 'phone' in self.fields:
+            # already normalized while validating the form
+            values['phone_e164'] = normalize_phone(values['phone'], 'US') if values['phone'] else None
+        return values
+
+    # parse the phone numbers of a batch at once, before validating its rows
+    def prepare(self, rows, pool=None):
+        if 'phone' not in self.fields:
+            return
+        phones = [row.get('phone') for row in rows if isinstance(row, dict) and row.get('phone')]
+        normalize_phones([str(phone) for phone in phones], 'US', pool=pool)
+
+    # held while a batch is checked, written and committed
+    def lock(self, rows):
+        return nullcontext()
+
+    # {index: errors} of the valid rows of a batch that can't be written
+    def check(self, rows):
+        return {}
+
+    def write(self, rows):
+        write_rows(self.model.__table__, self.columns, rows)
+
+    def finish(self):
+        pass
+
+
+class EntityImporter(Importer):
+    '''Venues and artists, whose genres are linked after each batch.'''
+
+    association = None
+
+    def write(self, rows):
+        last_id = db.session.query(db.func.max(self.model.id)).scalar() or 0
+        genres_by_name(name for row in rows for name in row['genres'].split(','))
+        db.session.flush()
+
+        super().write(rows)
+
+        foreign_key = [column for column in self.association.c if column.name != 'genre_id'][0]
+        link_genres(self.model, self.association, db.and_(
+            self.model.id > last_id,
+            ~db.exists().where(foreign_key == self.model.id)))
+
+
+class VenueImporter(EntityImporter):
+    form_class = VenueForm
+    model = Venue
+    association = venue_genres
+    fields = ('name', 'city', 'state', 'address', 'latitude', 'longitude',
+              'phone', 'genres', 'image_link', 'facebook_link')
+
+    def __init__(self):
+        super().__init__()
+        self.columns.append('geohash')
+
+    def values(self, form):
+        values = super().values(form)
+        located = values['latitude'] is not None and values['longitude'] is not None
+        values['geohash'] = encode_geohash(values['latitude'], values['longitude']) if located else None
+        return values
+
+    def finish(self):
+        venue_search.reset()
+        render_cache.invalidate(('venues',))
+
+
+class ArtistImporter(EntityImporter):
+    form_class = ArtistForm
+    model = Artist
+    association = artist_genres
+    fields = ('name', 'city', 'state', 'phone', 'genres', 'image_link',
+              'facebook_link')
+
+    def finish(self):
+        artist_search.reset()
+        render_cache.invalidate(('artists',))
+
+
+class ShowImporter(Importer):
+    form_class = ShowForm
+    model = Show
+    fields = ('artist_id', 'venue_id', 'start_time')
+
+    def __init__(self):
+        super().__init__()
+        # resolve the references in memory instead of one query per row
+        self.venue_ids = set()
+        self.artist_ids = set()
+        self.venue_names = {}
+        self.artist_names = {}
+        for ids, names, model in ((self.venue_ids, self.venue_names, Venue),
+                                  (self.artist_ids, self.artist_names, Artist)):
+            for entity_id, name in db.session.query(model.id, model.name):
+                ids.add(entity_id)
+                # an ambiguous name can't be used as a reference
+                names[name] = None if name in names else entity_id
+        self.touched = set()
+
+    def validate(self, row):
+        row = dict(row)
+        errors = {}
+        # the form would default a missing start time to today
+        if not row.get('start_time'):
+            errors['start_time'] = ['This field is required.']
+        for kind, ids, names in (('venue', self.venue_ids, self.venue_names),
+                                 ('artist', self.artist_ids, self.artist_names)):
+            key = kind + '_id'
+            if not row.get(key) and row.get(kind + '_name'):
+                row[key] = names.get(row[kind + '_name'])
+                if row[key] is None:
+                    errors[key] = ['Unknown or ambiguous {} name.'.format(kind)]
+                    continue
+            try:
+                if row.get(key) is not None and int(row[key]) not in ids:
+                    errors[key] = ['Unknown {}.'.format(kind)]
+            except (TypeError, ValueError):
+                errors[key] = ['Not a valid {} id.'.format(kind)]
+
+        values, form_errors = super().validate(row)
+        for key, messages in (form_errors or {}).items():
+            errors.setdefault(key, messages)
+        if errors:
+            return None, errors
+        values['artist_id'] = int(values['artist_id'])
+        values['venue_id'] = int(values['venue_id'])
+        return values, None
+
+    # the calendars of the batch are held until its commit, like the ones
+    # of a show submission
+    def lock(self, rows):
+        return lock_calendars_of_bookings([(row['venue_id'], row['artist_id']) for row in rows])
+
+    # the shows overlapping a show of the database or an earlier show of
+    # the batch
+    def check(self, rows):
+        conflicts = check_bookings([(row['venue_id'], row['artist_id'], row['start_time']) for row in rows])
+        return {index: {'start_time': ['The {} is already booked at that time.'.format(
+                    'venue' if calendar == VENUE_CALENDAR else 'artist')]}
+                for index, calendar in conflicts.items()}
+
+    def write(self, rows):
+        # the shared lock waits for a running counters roll-over
+        rolled_over_at = ShowCounterState.query\
+            .with_for_update(read=True)\
+            .one()\
+            .rolled_over_at
+        super().write(rows)
+
+        # add the new shows to the counters, one update per venue / artist
+        increments = {}
+        for row in rows:
+            counter = 'upcoming' if row['start_time'] >= rolled_over_at else 'past'
+            for kind in ('venue', 'artist'):
+                key = (kind, row[kind + '_id'])
+                increments.setdefault(key, {'upcoming': 0, 'past': 0})[counter] += 1
+        for model, kind in ((Venue, 'venue'), (Artist, 'artist')):
+            params = [{'entity_id': entity_id, 'upcoming': counts['upcoming'], 'past': counts['past']}
+                      for (key_kind, entity_id), counts in increments.items() if key_kind == kind]
+            if params:
+                db.session.execute(
+                    model.__table__.update()
+                    .where(model.id == db.bindparam('entity_id'))
+                    .values(
+                        upcoming_shows_count=model.upcoming_shows_count + db.bindparam('upcoming'),
+                        past_shows_count=model.past_shows_count + db.bindparam('past')),
+                    params)
+        self.touched.update(increments)
+
+    def finish(self):
+        render_cache.invalidate(('venues',), *self.touched)
+
+
+IMPORTERS = {
+    'venues': VenueImporter,
+    'artists': ArtistImporter,
+    'shows': ShowImporter,
+}
+
+
+# insert the rows with COPY on postgres, with executemany elsewhere
+def write_rows(table, columns, rows):
+    if db.engine.dialect.name != 'postgresql':
+        db.session.execute(table.insert(), rows)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(
+            table.name, ', '.join(columns)),
+        buffer)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def run_import(importer, rows, batch_size, on_reject, pool=None):
+    '''Validate and write the (line number, row) pairs, return the counts.'''
+    imported = rejected = 0
+
+    for batch in batches(rows, batch_size):
+        importer.prepare([row for _, row in batch], pool)
+        valid = []
+        for line_number, row in batch:
+            if isinstance(row, dict):
+                values, errors = importer.validate(row)
+            else:
+                values, errors = None, {'row': ['Not a valid row.']}
+            if errors:
+                rejected += 1
+                on_reject(line_number, row, errors)
+            else:
+                valid.append((line_number, row, values))
+
+        if not valid:
+            continue
+
+        # a failing batch is rejected as a whole, the import goes on
+        try:
+            with importer.lock([values for _, _, values in valid]):
+                conflicts = importer.check([values for _, _, values in valid])
+                writable = [values for index, (_, _, values) in enumerate(valid)
+                            if index not in conflicts]
+                if writable:
+                    importer.write(writable)
+                db.session.commit()
+            imported += len(writable)
+        except Exception as error:
+            db.session.rollback()
+            rejected += len(valid)
+            on_reject(batch[0][0], None, {'batch': [str(error)]})
+            continue
+
+        for index, errors in conflicts.items():
+            line_number, row, _ = valid[index]
+            rejected += 1
+            on_reject(line_number, row, errors)
+
+    importer.finish()
+    return imported, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('kind', choices=sorted(IMPORTERS))
+    parser.add_argument('path', help='csv or ndjson file, - for stdin')
+    parser.add_argument('--format', choices=('csv', 'ndjson'),
+                        help='default from the file extension')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--processes', type=int,
+                        help='parse the phone numbers across a pool of processes')
+    parser.add_argument('--rejects', help='write the rejected rows to this ndjson file')
+    args = parser.parse_args()
+
+    file_format = args.format or ('ndjson' if args.path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    reader = read_ndjson if file_format == 'ndjson' else read_csv
+    stream = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+    rejects = open(args.rejects, 'w', encoding='utf-8') if args.rejects else None
+
+    def on_reject(line_number, row, errors):
+        report = {'line': line_number, 'errors': errors, 'row': row}
+        if rejects:
+            rejects.write(json.dumps(report, default=str) + '\n')
+        else:
+            print('rejected line {}: {}'.format(line_number, errors), file=sys.stderr)
+
+    pool = ProcessPoolExecutor(args.processes) if args.processes else None
+
+    start = time.perf_counter()
+    try:
+        with app.app_context():
+            imported, rejected = run_import(
+                IMPORTERS[args.kind](), reader(stream), args.batch_size, on_reject,
+                pool=pool)
+    finally:
+        stream.close()
+        if pool is not None:
+            pool.shutdown()
+        if rejects:
+            rejects.close()
+    elapsed = time.perf_counter() - start
+
+    print('{} {} imported, {} rejected in {:.2f}s ({:.0f} rows/s)'.format(
+        imported, args.kind, rejected, elapsed, (imported + rejected) / elapsed if elapsed else 0))
+    return 1 if rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# Shared by the apps, each one carries a copy of this file: edit
+# shared/instrumentation.py and run `python shared/vendor.py` to update the
+# copies (`--check` only compares them).
+import threading
+import time
+
+from flask import g, request, has_request_context, current_app
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# upper bounds of the histogram buckets
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    '''
+    Cumulative histogram of observed values, one series per set of label
+    values, written in the Prometheus text exposition format.
+    '''
+
+    def __init__(self, name, documentation, buckets, labels):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> bucket counts, then the total count and sum
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * len(self.buckets) + [0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} histogram'.format(self.name)
+        ]
+        with self.lock:
+            items = sorted((label_values, list(series))
+                           for label_values, series in self.series.items())
+
+        for label_values, series in items:
+            labels = ['{}="{}"'.format(label, escape(value))
+                      for label, value in zip(self.labels, label_values)]
+            for bound, count in zip(self.buckets, series):
+                lines.append('{}_bucket{{{}}} {}'.format(
+                    self.name, ','.join(labels + ['le="{}"'.format(float(bound))]), count))
+            lines.append('{}_bucket{{{}}} {}'.format(
+                self.name, ','.join(labels + ['le="+Inf"']), series[-2]))
+            labels = '{{{}}}'.format(','.join(labels)) if labels else ''
+            lines.append('{}_count{} {}'.format(self.name, labels, series[-2]))
+            lines.append('{}_sum{} {}'.format(self.name, labels, series[-1]))
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestStats:
+    '''Statements, database time and render time of the current request.'''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+# the statements of every engine are counted, in the request they run in
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+class InstrumentedTemplate(Template):
+    '''Jinja template adding its render time to the current request.'''
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.render_seconds += time.perf_counter() - started
+
+
+class Instrumentation:
+    '''
+    Per route request metrics of a Flask app: number of SQL statements,
+    database time, template render time and total time, served at
+    METRICS_ENDPOINT (/metrics) in the Prometheus format.
+
+    Other metrics are added with add_collector, a function returning the
+    exposition lines. Functions added with add_check are called with the
+    route and the RequestStats of every request, and can fail it by raising
+    (see query_budget.QueryBudget).
+    '''
+
+    def __init__(self, app=None):
+        labels = ('route', 'method')
+        self.request_seconds = Histogram(
+            'http_request_duration_seconds', 'Total time of the requests.', TIME_BUCKETS, labels)
+        self.db_seconds = Histogram(
+            'http_request_db_seconds', 'Time spent in SQL statements by the requests.', TIME_BUCKETS, labels)
+        self.render_seconds = Histogram(
+            'http_request_render_seconds', 'Time spent rendering templates by the requests.', TIME_BUCKETS, labels)
+        self.queries = Histogram(
+            'http_request_queries', 'SQL statements issued by the requests.', QUERY_BUCKETS, labels)
+        self.collectors = []
+        self.checks = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENDPOINT', '/metrics')
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.jinja_env.template_class = InstrumentedTemplate
+        if app.config['METRICS_ENDPOINT']:
+            app.add_url_rule(app.config['METRICS_ENDPOINT'], 'metrics', self.metrics)
+
+    def before_request(self):
+        g.request_stats = RequestStats()
+
+    def after_request(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        label_values = (route, request.method)
+        self.request_seconds.observe(label_values, time.perf_counter() - stats.started)
+        self.db_seconds.observe(label_values, stats.db_seconds)
+        self.render_seconds.observe(label_values, stats.render_seconds)
+        self.queries.observe(label_values, stats.queries)
+
+        for check in self.checks:
+            check(route, stats)
+        return response
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def add_check(self, check):
+        self.checks.append(check)
+
+    def metrics(self):
+        lines = []
+        for histogram in (self.request_seconds, self.db_seconds, self.render_seconds, self.queries):
+            lines += histogram.expose()
+        for collector in self.collectors:
+            lines += collector()
+        return current_app.response_class(
+            '\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,34 @@
+"""add trigram indexes for venue and artist search
+
+Revision ID: 3f5c1b9a7d42
+Revises: 2d9e6b8f4c15
+Create Date: 2020-03-02 10:12:44.120381
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f5c1b9a7d42'
+down_revision = '2d9e6b8f4c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the GIN trigram indexes serve ilike('%term%') and similarity() ranking,
+    # they only exist on postgres
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venues_name_trgm', 'venues', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artists_name_trgm', 'artists', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_artists_name_trgm', table_name='artists')
+    op.drop_index('ix_venues_name_trgm', table_name='venues')
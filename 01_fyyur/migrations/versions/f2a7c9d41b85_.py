@@ -0,0 +1,39 @@
+"""cascade the show deletes
+
+Revision ID: f2a7c9d41b85
+Revises: 7d3f4a2c8e60
+Create Date: 2020-03-22 15:27:09.318204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c9d41b85'
+down_revision = '7d3f4a2c8e60'
+branch_labels = None
+depends_on = None
+
+# the foreign keys of the shows, named by postgres in the first migration
+FOREIGN_KEYS = (
+    ('shows_venue_id_fkey', 'venues', 'venue_id'),
+    ('shows_artist_id_fkey', 'artists', 'artist_id'),
+)
+
+
+def recreate_foreign_keys(ondelete):
+    # SQLite can't alter a constraint, its tables get the cascade from the
+    # models when created
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, table, column in FOREIGN_KEYS:
+        op.drop_constraint(name, 'shows', type_='foreignkey')
+        op.create_foreign_key(name, 'shows', table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    recreate_foreign_keys(None)
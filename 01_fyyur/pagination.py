@@ -0,0 +1,80 @@
+import base64
+import json
+
+from flask import request, abort
+from sqlalchemy import tuple_
+
+
+# encode the sort key of the last row of a page into an opaque url-safe token
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+# decode a cursor token back into the list of key values, None if malformed
+def decode_cursor(token):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+# whether the values of a cursor have the types of the sort key
+def cursor_matches(values, key_types):
+    if len(values) != len(key_types):
+        return False
+    # bool is an int subclass, but not a valid id
+    return all(type(value) is key_type for value, key_type in zip(values, key_types))
+
+
+# read the ?after= cursor and ?limit= page size from the request args.
+# key_types are the types of the sort key values (like (str, int) for a
+# name and an id), a cursor that doesn't match them aborts with a 400, or
+# calls `invalid` if given
+def page_args(default_limit, max_limit, key_types, invalid=None):
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+
+    after = None
+    token = request.args.get('after')
+    if token:
+        after = decode_cursor(token)
+        if after is None or not cursor_matches(after, key_types):
+            if invalid is not None:
+                invalid()
+            abort(400)
+
+    return after, limit
+
+
+class KeysetPage:
+    '''
+    One page of a keyset (seek) paginated query.
+
+    The query must be ordered by `columns`, the same columns `key` extracts
+    from a row. Rows are fetched lazily so the page can be consumed by a
+    streamed template; `next_cursor` is known once the page has been iterated.
+    '''
+
+    def __init__(self, query, columns, key, limit, after=None, batch_size=None):
+        if after is not None:
+            query = query.filter(tuple_(*columns) > tuple_(*after))
+        # fetch one extra row to know if there is a next page
+        query = query.limit(limit + 1)
+        if batch_size:
+            query = query.yield_per(batch_size)
+
+        self.query = query
+        self.key = key
+        self.limit = limit
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for count, row in enumerate(self.query):
+            if count == self.limit:
+                self.next_cursor = encode_cursor(self.key(last))
+                break
+            last = row
+            yield row
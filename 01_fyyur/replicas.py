@@ -0,0 +1,82 @@
+import random
+import time
+
+from flask import g, request, session, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+
+# methods of the read-only requests, served by the replicas
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(SignallingSession):
+    '''
+    Session reading from the replica picked for the current request, if
+    any, and writing (flushing) to the primary.
+    '''
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_request_context():
+            replica = g.get('db_replica')
+            if replica is not None:
+                return get_state(self.app).db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+
+# a session that wrote makes its client read from the primary for a while
+@event.listens_for(RoutingSession, 'after_flush')
+def remember_write(db_session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+# the bulk updates and deletes of Query are written without a flush
+@event.listens_for(RoutingSession, 'after_bulk_update')
+@event.listens_for(RoutingSession, 'after_bulk_delete')
+def remember_bulk_write(bulk_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    '''
+    SQLAlchemy sending the read-only requests to the read replicas.
+
+    The replicas are the SQLALCHEMY_REPLICA_URIS, registered as the
+    replica_<n> binds. A GET request is routed to one replica picked at
+    random, other requests and every flush go to the primary. A client
+    whose request wrote reads from the primary for REPLICA_STICKY_SECONDS
+    after it, so the page it is redirected to shows its own changes.
+    '''
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        for index, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+            binds['replica_{}'.format(index)] = uri
+        app.config['SQLALCHEMY_BINDS'] = binds
+        super().init_app(app)
+
+        app.before_request(self.route_request)
+        app.after_request(self.stick_to_primary)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def replicas(self, app):
+        return ['replica_{}'.format(index)
+                for index in range(len(app.config['SQLALCHEMY_REPLICA_URIS']))]
+
+    def route_request(self):
+        app = self.get_app()
+        replicas = self.replicas(app)
+        g.db_replica = None
+        if replicas and request.method in READ_METHODS \
+                and session.get('db_primary_until', 0) <= time.time():
+            g.db_replica = random.choice(replicas)
+
+    def stick_to_primary(self, response):
+        if g.get('db_wrote') and self.replicas(self.get_app()):
+            session['db_primary_until'] = time.time() + self.get_app().config['REPLICA_STICKY_SECONDS']
+        return response
@@ -0,0 +1,162 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, func
+
+
+# return the set of lower case trigrams of a text, padded like pg_trgm so
+# that the beginning and the end of the words weigh in the ranking
+def trigrams(text, padded=True):
+    text = ' '.join(text.lower().split())
+    if padded:
+        text = '  {} '.format(text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(left, right):
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+class TrigramIndex:
+    '''
+    Pure python inverted index from trigrams to document ids.
+
+    It answers the same case insensitive partial match as ilike('%term%')
+    without scanning every document: the candidates are the documents that
+    contain all the trigrams of the term, then the substring is checked and
+    the matches are ranked by trigram similarity with the term.
+    '''
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.documents = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id, text):
+        with self.lock:
+            self._remove(doc_id)
+            grams = trigrams(text)
+            self.documents[doc_id] = (text.lower(), grams)
+            for gram in grams:
+                self.postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        document = self.documents.pop(doc_id, None)
+        if document is None:
+            return
+        for gram in document[1]:
+            posting = self.postings[gram]
+            posting.discard(doc_id)
+            if not posting:
+                del self.postings[gram]
+
+    def search(self, term):
+        term = term.lower()
+        term_grams = trigrams(term)
+
+        with self.lock:
+            # terms shorter than a trigram can't use the postings
+            needed = trigrams(term, padded=False)
+            if needed:
+                postings = sorted(
+                    (self.postings.get(gram, set()) for gram in needed), key=len)
+                candidates = set.intersection(*postings)
+            else:
+                candidates = self.documents.keys()
+
+            matches = []
+            for doc_id in candidates:
+                text, grams = self.documents[doc_id]
+                if term in text:
+                    matches.append((-similarity(term_grams, grams), doc_id))
+
+        matches.sort()
+        return [doc_id for _, doc_id in matches]
+
+
+class ModelSearch:
+    '''
+    Ranked, paginated partial match search over a text column of a model.
+
+    On postgres the search runs in the database, where the ilike filter is
+    served by the pg_trgm GIN index and the rows are ranked by similarity().
+    Other databases (SQLite in tests) use an in-process TrigramIndex, loaded
+    on the first search and kept up to date by the mapper events.
+    '''
+
+    def __init__(self, db, model, column):
+        self.db = db
+        self.model = model
+        self.column = column
+        self.index = None
+        self.lock = threading.Lock()
+
+        event.listen(model, 'after_insert', self._on_save)
+        event.listen(model, 'after_update', self._on_save)
+        event.listen(model, 'after_delete', self._on_delete)
+
+    def _on_save(self, mapper, connection, target):
+        if self.index is not None:
+            self.index.add(target.id, getattr(target, self.column.key) or '')
+
+    def _on_delete(self, mapper, connection, target):
+        if self.index is not None:
+            self.index.remove(target.id)
+
+    def _load_index(self):
+        with self.lock:
+            if self.index is None:
+                index = TrigramIndex()
+                rows = self.db.session.query(self.model.id, self.column)
+                for doc_id, text in rows:
+                    index.add(doc_id, text or '')
+                self.index = index
+        return self.index
+
+    # drop rows deleted without the mapper events (bulk deletes)
+    def remove(self, doc_ids):
+        if self.index is not None:
+            for doc_id in doc_ids:
+                self.index.remove(doc_id)
+
+    def reset(self):
+        self.index = None
+
+    # return the total number of matches and the (id, text) rows of the page
+    def search(self, term, limit, offset=0):
+        if self.db.engine.dialect.name == 'postgresql':
+            return self._search_database(term, limit, offset)
+        return self._search_index(term, limit, offset)
+
+    def _search_database(self, term, limit, offset):
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = self.db.session.query(self.model.id, self.column)\
+            .filter(self.column.ilike('%{}%'.format(escaped), escape='\\'))
+
+        total = query.count()
+        rows = query.order_by(func.similarity(self.column, term).desc(), self.model.id)\
+            .limit(limit)\
+            .offset(offset)\
+            .all()
+        return total, rows
+
+    def _search_index(self, term, limit, offset):
+        doc_ids = self._load_index().search(term)
+        page_ids = doc_ids[offset:offset + limit]
+        if not page_ids:
+            return len(doc_ids), []
+
+        rows = self.db.session.query(self.model.id, self.column)\
+            .filter(self.model.id.in_(page_ids))\
+            .all()
+        rows_by_id = {row[0]: row for row in rows}
+        return len(doc_ids), [rows_by_id[doc_id] for doc_id in page_ids if doc_id in rows_by_id]
@@ -0,0 +1,57 @@
+'''
+Maintenance of the venue and artist show counters.
+
+    $ python show_counters.py rollover      # run periodically (cron, scheduler)
+    $ python show_counters.py check [--fix]
+
+`rollover` moves the shows that started since the last run from the
+upcoming to the past counters. `check` compares every counter with a full
+recount, exits with 1 if some are wrong and rewrites them with --fix.
+'''
+import argparse
+import sys
+import time
+
+from app import app, rollover_show_counters, check_show_counters
+
+
+def rollover(args):
+    start = time.perf_counter()
+    moved = rollover_show_counters()
+    print('moved {} shows from upcoming to past in {:.2f}s'.format(
+        moved, time.perf_counter() - start))
+    return 0
+
+
+def check(args):
+    differences = check_show_counters(fix=args.fix)
+    for table, entity_id, stored, actual in differences:
+        print('{} {}: stored upcoming/past {}/{}, recounted {}/{}'.format(
+            table, entity_id, stored[0], stored[1], actual[0], actual[1]))
+
+    if not differences:
+        print('all the show counters are consistent')
+        return 0
+    if args.fix:
+        print('fixed {} counters'.format(len(differences)))
+        return 0
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    commands.add_parser('rollover').set_defaults(run=rollover)
+    check_parser = commands.add_parser('check')
+    check_parser.add_argument('--fix', action='store_true',
+                              help='rewrite the counters that are wrong')
+    check_parser.set_defaults(run=check)
+
+    args = parser.parse_args()
+    with app.app_context():
+        return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request, has_request_context
+
+# attributes of every LogRecord, the other ones are extra fields
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    '''Format a record as one JSON line, with its extra fields.'''
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    '''
+    Tag the records with the id of the current request and drop the
+    unsampled ones: a request is sampled (all its records kept) with the
+    probability `sample_rate`, warnings and errors are always kept.
+    '''
+
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if not has_request_context():
+            return record.levelno >= logging.WARNING or random.random() < self.sample_rate
+        record.request_id = g.get('request_id')
+        return record.levelno >= logging.WARNING or g.get('log_sampled', True)
+
+
+class BackgroundQueueHandler(QueueHandler):
+    '''
+    Queue the records for the listener thread. The message and traceback
+    are resolved here, the JSON formatting and the I/O happen off-thread.
+    '''
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# route the app logger through a queue to a JSON lines handler written by a
+# background thread, and log a line per request with its id and timings
+def init_logging(app):
+    level = logging.getLevelName(app.config.get('LOG_LEVEL', 'INFO'))
+    sample_rate = app.config.get('LOG_SAMPLE_RATE', 1.0)
+    log_file = app.config.get('LOG_FILE')
+
+    handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    listener = QueueListener(queue.Queue(-1), handler)
+    queue_handler = BackgroundQueueHandler(listener.queue)
+    queue_handler.addFilter(RequestContextFilter(sample_rate))
+
+    app.logger.handlers = [queue_handler]
+    app.logger.setLevel(level)
+    app.logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.log_sampled = random.random() < sample_rate
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        if 'request_id' not in g:
+            return response
+        response.headers['X-Request-ID'] = g.request_id
+        if app.config.get('LOG_REQUESTS', True):
+            timings = {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 3)
+            }
+            # statements and database time recorded by the instrumentation
+            stats = g.get('request_stats')
+            if stats is not None:
+                timings['queries'] = stats.queries
+                timings['db_ms'] = round(stats.db_seconds * 1000, 3)
+            app.logger.info('request', extra=timings)
+        return response
+
+    return listener
@@ -0,0 +1,259 @@
+import os
+import unittest
+import json
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import app as fyyur  # noqa: E402
+from app import db, Venue, Artist, Show, set_genres  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.app = fyyur.app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_ENGINE_OPTIONS'] = fyyur.engine_options('sqlite://')
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['LOG_REQUESTS'] = False
+        self.client = self.app.test_client
+        fyyur.render_cache.backend.clear()
+
+        # binds the app to the current context
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+
+    def tearDown(self):
+        """Executed after reach test"""
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add_venue(self, name, **columns):
+        venue = Venue(name=name, city='San Francisco', state='CA',
+                      address='1015 Folsom Street', genres='Jazz', **columns)
+        db.session.add(venue)
+        db.session.commit()
+        return venue.id
+
+    def add_artist(self, name, **columns):
+        artist = Artist(name=name, city='San Francisco', state='CA',
+                        genres='Jazz', **columns)
+        db.session.add(artist)
+        db.session.commit()
+        return artist.id
+
+    def add_genre_listings(self):
+        with self.app.app_context():
+            for name, genre in (('Jazz Hall', 'Jazz'), ('Rock Hall', 'Rock'), ('Rock Club', 'Rock')):
+                venue = Venue(name=name, city='San Francisco', state='CA',
+                              address='1015 Folsom Street')
+                set_genres(venue, [genre])
+                artist = Artist(name=name + ' Band', city='San Francisco', state='CA')
+                set_genres(artist, [genre])
+                db.session.add_all([venue, artist])
+            db.session.commit()
+
+    # test for GET /genres/<genre_name>/venues
+    def test_genre_listings_are_cached_by_genre(self):
+        self.add_genre_listings()
+        for listing in ('venues', 'artists'):
+            res = self.client().get('/genres/Jazz/' + listing)
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(b'Jazz Hall', res.data)
+            res = self.client().get('/genres/Rock/' + listing)
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(b'Rock Hall', res.data)
+            self.assertNotIn(b'Jazz Hall', res.data)
+
+    # test for GET /genres/<genre_name>/venues
+    def test_genre_listing_next_page(self):
+        self.add_genre_listings()
+        for listing, last in (('venues', b'Rock Club'), ('artists', b'Rock Hall Band')):
+            res = self.client().get('/genres/Rock/' + listing, query_string={'limit': 1})
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(b'/genres/Rock/' + listing.encode() + b'?after=', res.data)
+            next_page = res.data.split(b'href="/genres/Rock/' + listing.encode())[1].split(b'"')[0]
+            res = self.client().get('/genres/Rock/' + listing + next_page.decode().replace('&amp;', '&'))
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(last, res.data)
+
+    # test for import_data.py shows
+    def test_import_rejects_overlapping_shows(self):
+        from import_data import ShowImporter, run_import
+
+        with self.app.app_context():
+            venue_id = self.add_venue('The Musical Hop')
+            other_venue_id = self.add_venue('Park Square Live Music & Coffee')
+            artist_ids = [self.add_artist(name) for name in ('Guns N Petals', 'Matt Quevedo', 'The Wild Sax Band')]
+            db.session.add(Show(venue_id=venue_id, artist_id=artist_ids[0],
+                                start_time=datetime(2035, 4, 1, 20, 0)))
+            db.session.commit()
+
+            rows = [
+                # overlaps the show of the database at the venue
+                {'venue_id': venue_id, 'artist_id': artist_ids[1], 'start_time': '2035-04-01 21:00:00'},
+                {'venue_id': venue_id, 'artist_id': artist_ids[1], 'start_time': '2035-05-01 20:00:00'},
+                # overlaps the previous row of the batch at the venue
+                {'venue_id': venue_id, 'artist_id': artist_ids[2], 'start_time': '2035-05-01 21:00:00'},
+                # overlaps the second row of the batch for the artist
+                {'venue_id': other_venue_id, 'artist_id': artist_ids[1], 'start_time': '2035-05-01 22:00:00'},
+                {'venue_id': other_venue_id, 'artist_id': artist_ids[2], 'start_time': '2035-05-01 22:00:00'},
+            ]
+            rejects = []
+            imported, rejected = run_import(
+                ShowImporter(), enumerate(rows, 2), 100,
+                lambda line_number, row, errors: rejects.append(line_number))
+
+            self.assertEqual((imported, rejected), (2, 3))
+            self.assertEqual(sorted(rejects), [2, 4, 5])
+            self.assertEqual(Show.query.count(), 3)
+
+    # test for GET /venues
+    def test_venues_with_malformed_cursor(self):
+        for after in ([[1], {}, 'c'], ['CA', 'San Francisco', 'x'], ['CA', 'San Francisco', True], ['CA', 1]):
+            res = self.client().get('/venues', query_string={'after': encode_cursor(after)})
+            self.assertEqual(res.status_code, 400)
+
+    # test for GET /artists
+    def test_artists_with_malformed_cursor(self):
+        for after in ([1, 'Guns N Petals'], ['Guns N Petals', '1'], ['Guns N Petals', None], ['Guns N Petals']):
+            res = self.client().get('/artists', query_string={'after': encode_cursor(after)})
+            self.assertEqual(res.status_code, 400)
+
+    # test for GET /api/v1/venues
+    def test_api_listing_with_malformed_cursor(self):
+        for url in ('/api/v1/venues', '/api/v1/shows'):
+            for after in (['x'], [1.5], [False], [1, 2]):
+                res = self.client().get(url, query_string={'after': encode_cursor(after)})
+                data = json.loads(res.data)
+                self.assertEqual(res.status_code, 400)
+                self.assertEqual(data['error'], 400)
+
+    # test for GET /api/v1/venues/<venue_id>
+    def test_api_revalidation(self):
+        with self.app.app_context():
+            venue_id = self.add_venue('The Musical Hop')
+
+        url = '/api/v1/venues/{}'.format(venue_id)
+        res = self.client().get(url)
+        etag = res.headers['ETag']
+        self.assertEqual(res.status_code, 200)
+        res = self.client().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        # another url has another tag
+        res = self.client().get(url, query_string={'fields': 'name'}, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+
+        with self.app.app_context():
+            Venue.query.filter(Venue.id == venue_id).update({'name': 'The Dueling Pianos Bar'})
+            db.session.commit()
+        res = self.client().get(url, headers={'If-None-Match': etag})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['data']['name'], 'The Dueling Pianos Bar')
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    # test for DELETE /venues/<venue_id>
+    def test_delete_venue(self):
+        with self.app.app_context():
+            venue_id = self.add_venue('The Musical Hop')
+
+        replicas = self.app.config['SQLALCHEMY_REPLICA_URIS']
+        self.app.config['SQLALCHEMY_REPLICA_URIS'] = ['sqlite://']
+        try:
+            with self.client() as client:
+                res = client.delete('/venues/{}'.format(venue_id))
+                data = json.loads(res.data)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(data['deleted'], [venue_id])
+                # the bulk delete makes the client read its own write
+                with client.session_transaction() as session:
+                    self.assertIn('db_primary_until', session)
+                    self.assertNotIn('_flashes', session)
+        finally:
+            self.app.config['SQLALCHEMY_REPLICA_URIS'] = replicas
+
+        res = self.client().delete('/venues/{}'.format(venue_id))
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['error'], 404)
+
+    # test for POST /venues/delete
+    def test_delete_venues_with_invalid_ids(self):
+        for body in ({'venue_ids': [True]}, {'venue_ids': ['1']}, {'venue_ids': 1}, {}, [1]):
+            res = self.client().post('/venues/delete', json=body)
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(data['error'], 400)
+
+    # test for GET /venues/<venue_id>/availability
+    def test_availability_with_utc_offsets(self):
+        with self.app.app_context():
+            venue_id = self.add_venue('The Musical Hop')
+
+        url = '/venues/{}/availability'.format(venue_id)
+        for query_string in ({'from': '2029-12-31T00:00', 'to': '2030-01-01T00:00Z'},
+                             {'from': '2030-01-01T00:00+02:00', 'to': '2030-01-02T00:00'}):
+            res = self.client().get(url, query_string=query_string)
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn('+', data['from'] + data['to'])
+
+    # test for GET /venues/<venue_id>
+    def test_venue_past_shows_in_start_time_order(self):
+        with self.app.app_context():
+            venue_id = self.add_venue('The Musical Hop')
+            first = self.add_artist('Guns N Petals')
+            second = self.add_artist('Matt Quevedo')
+            now = datetime.now()
+            db.session.add_all([
+                Show(venue_id=venue_id, artist_id=second, start_time=now - timedelta(days=1)),
+                Show(venue_id=venue_id, artist_id=first, start_time=now - timedelta(days=2))])
+            db.session.commit()
+
+        for limit in (10, None):
+            self.app.config['SHOW_TIMELINE_LIMIT'] = limit
+            fyyur.render_cache.backend.clear()
+            res = self.client().get('/venues/{}'.format(venue_id))
+            self.assertEqual(res.status_code, 200)
+            self.assertLess(res.data.index(b'Guns N Petals'), res.data.index(b'Matt Quevedo'))
+
+    # test for GET /shows
+    def test_shows_with_malformed_cursor(self):
+        for after in ([1, 2], ['notadate', 2], ['2030-01-01T20:00:00', 'x'], ['2030-01-01']):
+            for url in ('/shows', '/shows.json'):
+                res = self.client().get(url, query_string={'after': encode_cursor(after)})
+                self.assertEqual(res.status_code, 400)
+
+    # test for GET /shows
+    def test_shows_after_cursor(self):
+        with self.app.app_context():
+            venue_id = self.add_venue('The Musical Hop')
+            artist_id = self.add_artist('Guns N Petals')
+            start = datetime.now() + timedelta(days=1)
+            db.session.add_all([Show(venue_id=venue_id, artist_id=artist_id,
+                                     start_time=start + timedelta(days=day))
+                                for day in range(3)])
+            db.session.commit()
+
+        res = self.client().get('/shows.json', query_string={'limit': 2})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['shows']), 2)
+        res = self.client().get('/shows.json', query_string={'limit': 2, 'after': data['next_cursor']})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['shows']), 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+from bisect import bisect_left
+
+from sqlalchemy import func, case
+
+
+class ShowTimeline:
+    '''
+    Shows of a venue or an artist split at a single reference time.
+
+    Both lists are ordered by start time, a capped `past` keeps the most
+    recent shows. The counts are the totals, even when the lists are capped.
+    '''
+
+    def __init__(self, past, upcoming, past_count, upcoming_count):
+        self.past = past
+        self.upcoming = upcoming
+        self.past_count = past_count
+        self.upcoming_count = upcoming_count
+
+
+# split the shows selected by `query` into past and upcoming ones at `now`.
+# Without a limit every show is fetched in one ordered query and split in
+# one pass; with a limit only the `limit` most recent past and next
+# upcoming shows are fetched, plus their totals.
+def load_timeline(query, start_time, now, limit=None):
+    if limit is None:
+        rows = query.order_by(start_time).all()
+        split = bisect_left([row.start_time for row in rows], now)
+        past = rows[:split]
+        upcoming = rows[split:]
+        return ShowTimeline(past, upcoming, len(past), len(upcoming))
+
+    past_count, upcoming_count = query\
+        .with_entities(
+            func.coalesce(func.sum(case([(start_time < now, 1)], else_=0)), 0),
+            func.coalesce(func.sum(case([(start_time >= now, 1)], else_=0)), 0))\
+        .order_by(None)\
+        .one()
+
+    past = []
+    if past_count:
+        # the most recent ones, back in start time order
+        past = query.filter(start_time < now)\
+            .order_by(start_time.desc())\
+            .limit(limit)\
+            .all()[::-1]
+
+    upcoming = []
+    if upcoming_count:
+        upcoming = query.filter(start_time >= now)\
+            .order_by(start_time)\
+            .limit(limit)\
+            .all()
+
+    return ShowTimeline(past, upcoming, int(past_count), int(upcoming_count))
@@ -0,0 +1,105 @@
+'''
+Benchmark of the question search.
+
+Searches a bank of generated questions for a few terms, from rare to common
+ones, and reports the p50 and p95 latency of the former ILIKE scan of the
+questions and of POST /questions with a search term. Runs against a temporary
+SQLite database by default (the search is then done by the index of the
+process):
+
+    $ python benchmarks/question_search.py
+
+Set BENCH_DATABASE_URI to run it against a PostgreSQL database with the
+indexes of migrations/0001_question_search.sql, and BENCH_QUESTIONS to change
+the size of the bank (100000 by default).
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+
+# make the backend modules importable when the script is run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the app connects to DATABASE_URL as soon as it is created
+directory = None
+if 'BENCH_DATABASE_URI' not in os.environ:
+    directory = tempfile.TemporaryDirectory()
+    os.environ['BENCH_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory.name, 'search.db')
+os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URI']
+
+from flaskr import create_app  # noqa: E402
+from models import db, Question, Category  # noqa: E402
+
+QUESTIONS = int(os.environ.get('BENCH_QUESTIONS', 100000))
+CATEGORIES = 6
+SEARCHES = 50
+WORDS = ['word{}'.format(i) for i in range(5000)]
+TERMS = ('word4999', 'word12', 'word1', 'world cup', 'zzz')
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    db.session.add_all([Category('Category {}'.format(i)) for i in range(CATEGORIES)])
+    db.session.commit()
+    generator = random.Random(0)
+    for start in range(0, QUESTIONS, 10000):
+        db.session.bulk_insert_mappings(Question, [{
+            # word<n> is about n times rarer than word1
+            'question': ' '.join(WORDS[int(generator.paretovariate(1)) % len(WORDS)]
+                                 for _ in range(8)),
+            'answer': 'answer {}'.format(i),
+            'category': str(i % CATEGORIES + 1),
+            'difficulty': i % 5 + 1
+        } for i in range(start, min(start + 10000, QUESTIONS))])
+        db.session.commit()
+
+
+# the search before the search indexes
+def ilike_scan(client, term):
+    selection = Question.query.filter(Question.question.ilike('%{}%'.format(term)))
+    [question.format() for question in selection.all()]
+    selection.count()
+
+
+def endpoint(client, term):
+    client.post('/questions', json={'searchTerm': term})
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return (timings[len(timings) // 2] * 1000,
+            timings[int(len(timings) * 0.95)] * 1000)
+
+
+def main():
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        seed()
+        # load the index of the process outside of the measures
+        client.post('/questions', json={'searchTerm': TERMS[0]})
+
+        print('{} questions, ms per search'.format(QUESTIONS))
+        print('{:>10} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+            'term', 'matches', 'ILIKE p50', 'ILIKE p95', 'p50', 'p95'))
+        for term in TERMS:
+            total = client.post('/questions', json={'searchTerm': term}).get_json()['totalQuestions']
+            row = []
+            for search in (ilike_scan, endpoint):
+                timings = []
+                for _ in range(SEARCHES):
+                    started = time.perf_counter()
+                    search(client, term)
+                    timings.append(time.perf_counter() - started)
+                row += percentiles(timings)
+            print('{:>10} {:>8} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}'.format(term, total, *row))
+
+    if directory is not None:
+        directory.cleanup()
+
+
+if __name__ == '__main__':
+    main()
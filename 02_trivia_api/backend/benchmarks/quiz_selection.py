@@ -0,0 +1,100 @@
+'''
+Benchmark of the /quizzes question selection across quiz lengths.
+
+Plays quizzes of growing length over a bank of questions and compares the
+time per question of the former NOT IN query with the in-memory question
+pool, both with the previous questions sent by the client and with a server
+side quiz session. Runs against a temporary SQLite database by default:
+
+    $ python benchmarks/quiz_selection.py
+
+Set BENCH_DATABASE_URI to run it against a real database instead.
+'''
+import os
+import sys
+import tempfile
+import time
+
+# make the backend modules importable when the script is run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the app connects to DATABASE_URL as soon as it is created
+directory = None
+if 'BENCH_DATABASE_URI' not in os.environ:
+    directory = tempfile.TemporaryDirectory()
+    os.environ['BENCH_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory.name, 'quiz.db')
+os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URI']
+
+from flaskr import create_app  # noqa: E402
+from models import db, Question, Category  # noqa: E402
+
+QUESTIONS = 20000
+CATEGORIES = 6
+QUIZ_LENGTHS = (5, 50, 500, 2000)
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    db.session.add_all([Category('Category {}'.format(i)) for i in range(CATEGORIES)])
+    db.session.commit()
+    db.session.bulk_insert_mappings(Question, [{
+        'question': 'Question {}'.format(i),
+        'answer': 'Answer {}'.format(i),
+        'category': str(i % CATEGORIES + 1),
+        'difficulty': i % 5 + 1
+    } for i in range(QUESTIONS)])
+    db.session.commit()
+
+
+# the selection before the question pool
+def not_in_query(length):
+    previous = []
+    for _ in range(length):
+        question = Question.query.filter(~Question.id.in_(previous)).first()
+        previous.append(question.id)
+
+
+def client_history(client, length):
+    previous = []
+    for _ in range(length):
+        data = client.post('/quizzes', json={
+            'previous_questions': previous,
+            'quiz_category': {'id': 0}
+        }).get_json()
+        previous.append(data['question']['id'])
+
+
+def server_session(client, length):
+    data = client.post('/quizzes', json={'quiz_category': {'id': 0}, 'session': True}).get_json()
+    quiz_id = data['quiz_id']
+    for _ in range(length - 1):
+        client.post('/quizzes', json={'quiz_id': quiz_id})
+
+
+def main():
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        seed()
+        # load the question pool outside of the measures
+        client.post('/quizzes', json={'quiz_category': {'id': 0}})
+
+        print('{} questions, ms per question'.format(QUESTIONS))
+        print('{:>8} {:>10} {:>10} {:>10}'.format('length', 'NOT IN', 'history', 'session'))
+        for length in QUIZ_LENGTHS:
+            timings = []
+            for play in (not_in_query,
+                         lambda length: client_history(client, length),
+                         lambda length: server_session(client, length)):
+                started = time.perf_counter()
+                play(length)
+                timings.append((time.perf_counter() - started) / length * 1000)
+            print('{:>8} {:>10.3f} {:>10.3f} {:>10.3f}'.format(length, *timings))
+
+    if directory is not None:
+        directory.cleanup()
+
+
+if __name__ == '__main__':
+    main()
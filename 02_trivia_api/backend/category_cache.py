@@ -0,0 +1,74 @@
+import hashlib
+import json
+import threading
+import time
+
+from flask import current_app, request
+
+
+class CategoryCache:
+    '''
+    Process level copy of the categories, as an id -> type dict and as the
+    serialized /categories body with its ETag.
+
+    `load` returns the (id, type) rows of the categories. The copy is loaded
+    on first use and reloaded after `ttl` seconds (never when None) or once
+    invalidated.
+    '''
+
+    def __init__(self, load, ttl=None):
+        self.load = load
+        self.ttl = ttl
+        self.state = None
+        self.lock = threading.Lock()
+
+    def _expired(self, state):
+        return state is None or (self.ttl is not None and time.monotonic() - state[3] > self.ttl)
+
+    def _current(self):
+        state = self.state
+        if self._expired(state):
+            with self.lock:
+                if self.state is state:
+                    self.state = self._build()
+                state = self.state
+        return state
+
+    def _build(self):
+        types = {category_id: category_type for category_id, category_type in self.load()}
+        body = json.dumps({'success': True, 'categories': types}, sort_keys=True)
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        return types, body, etag, time.monotonic()
+
+    def invalidate(self):
+        self.state = None
+
+    def types(self):
+        return self._current()[0]
+
+    # the formatted category of an id, None if there is no such category
+    def get(self, category_id):
+        try:
+            category_id = int(category_id)
+        except (TypeError, ValueError):
+            return None
+        category_type = self.types().get(category_id)
+        if category_type is None:
+            return None
+        return {'id': category_id, 'type': category_type}
+
+    # the /categories response. A client sending the ETag of the cached copy
+    # gets an empty 304 without the categories being loaded nor their body
+    # being copied in a response
+    def response(self):
+        state = self.state
+        if self._expired(state):
+            state = self._current()
+        types, body, etag, loaded_at = state
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response
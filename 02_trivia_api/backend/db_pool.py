@@ -0,0 +1,105 @@
+# Shared by the apps, each one carries a copy of this file: edit
+# shared/db_pool.py and run `python shared/vendor.py` to update the
+# copies (`--check` only compares them).
+import os
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from instrumentation import Histogram, TIME_BUCKETS
+
+
+class MeasuredQueuePool(QueuePool):
+    '''QueuePool recording how long the checkouts wait and how many time out.'''
+
+    def __init__(self, creator, **kwargs):
+        super().__init__(creator, **kwargs)
+        self.checkout_wait = Histogram(
+            'db_pool_checkout_wait_seconds',
+            'Time waited for a connection of the pool.',
+            TIME_BUCKETS,
+            ())
+        self.checkout_timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            self.checkout_wait.observe((), time.perf_counter() - started)
+
+
+def env_flag(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# engine options of a database uri from the environment:
+#   DB_POOL_SIZE         connections kept open per process (default 5)
+#   DB_MAX_OVERFLOW      extra connections opened under load (default 10)
+#   DB_POOL_TIMEOUT      seconds to wait for a connection (default 30)
+#   DB_POOL_RECYCLE      seconds before a connection is reopened (default 1800)
+#   DB_POOL_PRE_PING     test the connections on checkout (default on)
+# Without DB_POOL_SIZE but with DB_MAX_CONNECTIONS, the connections allowed
+# by the server are shared between the WEB_CONCURRENCY gunicorn workers.
+def engine_options(database_uri, environ=os.environ):
+    options = {'pool_pre_ping': env_flag(environ.get('DB_POOL_PRE_PING', '1'))}
+    # in memory SQLite databases keep their single static connection
+    if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+        return options
+
+    max_overflow = int(environ.get('DB_MAX_OVERFLOW', 10))
+    if 'DB_POOL_SIZE' in environ:
+        pool_size = int(environ['DB_POOL_SIZE'])
+    elif 'DB_MAX_CONNECTIONS' in environ:
+        per_worker = int(environ['DB_MAX_CONNECTIONS']) // int(environ.get('WEB_CONCURRENCY', 1))
+        max_overflow = min(max_overflow, per_worker // 2)
+        pool_size = max(1, per_worker - max_overflow)
+    else:
+        pool_size = 5
+
+    options.update(
+        poolclass=MeasuredQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=float(environ.get('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(environ.get('DB_POOL_RECYCLE', 1800)))
+    if database_uri.startswith('sqlite'):
+        options['connect_args'] = {'check_same_thread': False}
+    return options
+
+
+# lines of a gauge or counter without labels
+def expose_value(name, documentation, kind, value):
+    return [
+        '# HELP {} {}'.format(name, documentation),
+        '# TYPE {} {}'.format(name, kind),
+        '{} {}'.format(name, value)
+    ]
+
+
+# exposition lines of the state of the pool of an engine
+def pool_metrics(engine):
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return []
+
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    lines = expose_value(
+        'db_pool_size', 'Connections kept open by the pool.', 'gauge', pool.size())
+    lines += expose_value(
+        'db_pool_checked_out', 'Connections in use.', 'gauge', pool.checkedout())
+    lines += expose_value(
+        'db_pool_overflow', 'Connections opened over the pool size.', 'gauge', max(pool.overflow(), 0))
+    lines += expose_value(
+        'db_pool_saturation', 'Share of the pool capacity in use.', 'gauge',
+        pool.checkedout() / capacity if capacity else 0)
+    if isinstance(pool, MeasuredQueuePool):
+        lines += pool.checkout_wait.expose()
+        lines += expose_value(
+            'db_pool_checkout_timeouts_total', 'Checkouts that timed out.', 'counter',
+            pool.checkout_timeouts)
+    return lines
@@ -1,29 +1,117 @@
 import os
-from flask import Flask, request, abort, jsonify
+import time
+import click
+from flask import Flask, request, abort, jsonify, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import func
 import random
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
+from instrumentation import Instrumentation
+from query_budget import QueryBudget
+from db_pool import pool_metrics
+from quiz import QuestionPool, QuizSessions, InvalidCategory, category_key
+from category_cache import CategoryCache
+from search import question_search
+from ingest import CHUNK_SIZE, ingest, read_csv, read_ndjson
 
 QUESTIONS_PER_PAGE = 10
+# seconds the totals of the question listings are cached
+COUNT_CACHE_SECONDS = 30
+# maximum number of questions of a POST /questions/batch
+BATCH_MAX_QUESTIONS = 10000
+# seconds the categories are cached, None to keep them until invalidated
+CATEGORY_CACHE_SECONDS = 300
 
 
-def paginate_questions(request, selection):
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
+def paginate_questions(request, query):
+    # the page is selected in SQL, only its rows are loaded: after the
+    # ?after= question id (keyset cursor) or at the ?page= offset
+    query = query.order_by(Question.id)
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(Question.id > after)
+    else:
+        page = max(request.args.get('page', 1, type=int), 1)
+        query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
 
-    formatted_questions = [question.format() for question in selection]
-    current_questions = formatted_questions[start:end]
+    questions = query.limit(QUESTIONS_PER_PAGE).all()
+    return [question.format() for question in questions]
 
-    return current_questions
+
+def next_cursor(questions):
+    # cursor of the next page, None on the last page
+    if len(questions) < QUESTIONS_PER_PAGE:
+        return None
+    return questions[-1]['id']
+
+
+def count_questions(query, key=None):
+    # SELECT count(*) of a query, cached COUNT_CACHE_SECONDS under key
+    question_counts = current_app.extensions['question_counts']
+    now = time.monotonic()
+    if key is not None:
+        cached = question_counts.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+    count = query.with_entities(func.count(Question.id)).order_by(None).scalar()
+    if key is not None:
+        question_counts[key] = (now + COUNT_CACHE_SECONDS, count)
+    return count
+
+
+def invalidate_question_counts():
+    current_app.extensions['question_counts'].clear()
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
     setup_db(app)
+    # per route query counts and timings, and the state of the connection
+    # pool, served at /metrics, and the query budgets of the routes
+    instrumentation = Instrumentation(app)
+    instrumentation.add_collector(lambda: pool_metrics(db.engine))
+    QueryBudget(instrumentation, app)
+
+    # cached totals of the question listings, key -> (expiry time, count)
+    app.extensions['question_counts'] = {}
+
+    # the categories rarely change, they are read from a process level copy
+    category_cache = CategoryCache(
+        lambda: db.session.query(Category.id, Category.type).all(),
+        ttl=CATEGORY_CACHE_SECONDS)
+
+    # ranked search of the questions and answers, by the database full text
+    # and trigram indexes on PostgreSQL, by an index of the process elsewhere
+    searcher = question_search(db.engine)
+
+    # question ids per category for the quizzes, and the quizzes played
+    # with a server side session
+    quiz_pool = QuestionPool()
+    quiz_sessions = QuizSessions()
+
+    def next_quiz_question(category, seen):
+        if quiz_pool.expired():
+            quiz_pool.load(db.session.query(Question.id, Question.category))
+        while True:
+            question_id = quiz_pool.pick(category, seen)
+            if question_id is None:
+                return None
+            question = Question.query.get(question_id)
+            if question is not None:
+                return question
+            # deleted by another process since the pool was loaded
+            quiz_pool.remove(question_id)
+
+    # the questions were added in bulk, they are reloaded by the caches
+    def questions_changed():
+        invalidate_question_counts()
+        quiz_pool.invalidate()
+        searcher.invalidate()
+
     cors = CORS(app, resources={r"/*": {"origins": "*"}})
 
     # CORS Headers
@@ -37,16 +125,8 @@ def create_app(test_config=None):
 
     @app.route('/categories', methods=['GET'])
     def retrieve_categories():
-        categories = Category.query.all()
-        formatted_categories = {}
-
-        for category in categories:
-            formatted_categories[category.id] = category.type
-
-        return jsonify({
-            'success': True,
-            'categories': formatted_categories
-        })
+        # pre-serialized body, with an ETag
+        return category_cache.response()
 
     @app.route('/questions', methods=['GET', 'POST'])
     def get_questions():
@@ -55,21 +135,25 @@ def create_app(test_config=None):
         if request.method == "POST":
             search_term = body.get("searchTerm")
             if search_term is not None:
-                search_term = f"%{search_term}%"
-                questions = Question.query.filter(
-                    Question.question.ilike(search_term)).all()
-                formatted_questions = paginate_questions(request, questions)
+                page = max(request.args.get('page', 1, type=int), 1)
+                questions, total_questions = searcher.search(
+                    str(search_term), (page - 1) * QUESTIONS_PER_PAGE,
+                    QUESTIONS_PER_PAGE)
+                formatted_questions = [question.format()
+                                       for question in questions]
                 current_category = None
 
-                if (len(questions) > 0):
-                    current_category = Category.query.get(
-                        questions[0].category).format()
+                if (len(formatted_questions) > 0):
+                    current_category = category_cache.get(
+                        formatted_questions[0]['category'])
+                elif page > 1:
+                    abort(404)
 
                 return jsonify({
                     'success': True,
                     'questions': formatted_questions,
                     'currentCategory': current_category,
-                    'totalQuestions': len(questions)
+                    'totalQuestions': total_questions
                 })
             else:
                 question = body.get("question")
@@ -80,11 +164,18 @@ def create_app(test_config=None):
                 # I think it should be validated in the form not here
                 if(answer == '' or question == '' or answer is None or question is None):
                     abort(400)
+                # checked before the insert, the question must be usable
+                # by the quizzes once saved
+                if category_cache.get(category) is None:
+                    abort(422)
 
                 question = Question(question=question, answer=answer,
                                     category=category, difficulty=difficulty)
                 try:
                     question.insert()
+                    invalidate_question_counts()
+                    quiz_pool.add(question.id, question.category)
+                    searcher.add(question)
                     return jsonify({
                         "success": True,
                         'question_id': question.id
@@ -92,29 +183,62 @@ def create_app(test_config=None):
                 except:
                     abort(422)
         else:
-            questions = Question.query.all()
-            categories = Category.query.all()
-            formatted_questions = paginate_questions(request, questions)
-            formatted_categories = {}
+            formatted_questions = paginate_questions(request, Question.query)
             current_category = None
 
             if (len(formatted_questions) > 0):
-                current_category = Category.query.get(
-                    questions[0].category).format()
+                current_category = category_cache.get(
+                    formatted_questions[0]['category'])
             else:
                 abort(404)
 
-            for category in categories:
-                formatted_categories[category.id] = category.type
-
             return jsonify({
                 'success': True,
                 'questions': formatted_questions,
-                'categories': formatted_categories,
+                'categories': category_cache.types(),
                 'currentCategory': current_category,
-                'total_questions': len(questions)
+                'total_questions': count_questions(Question.query, key='all'),
+                'next_cursor': next_cursor(formatted_questions)
             })
 
+    # adds a list of questions in chunked transactions, the invalid rows are
+    # reported and skipped
+    @app.route('/questions/batch', methods=['POST'])
+    def create_questions():
+        body = request.get_json(silent=True)
+        rows = body.get('questions') if isinstance(body, dict) else body
+        if not isinstance(rows, list) or len(rows) > BATCH_MAX_QUESTIONS:
+            abort(400)
+
+        report = ingest(enumerate(rows), set(category_cache.types()))
+        if report.inserted:
+            questions_changed()
+        return jsonify(dict(report.format(), success=True))
+
+    # flask load-questions FILE streams the questions of a NDJSON or CSV
+    # file (- for stdin) into the database
+    @app.cli.command('load-questions')
+    @click.argument('file', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']),
+                  help='Format of the file, guessed from its extension by default.')
+    @click.option('--chunk-size', default=CHUNK_SIZE, show_default=True,
+                  help='Questions inserted by each transaction.')
+    def load_questions(file, file_format, chunk_size):
+        if file_format is None:
+            file_format = 'csv' if file.name.endswith('.csv') else 'ndjson'
+        rows = read_csv(file) if file_format == 'csv' else read_ndjson(file)
+
+        def progress(report):
+            click.echo('{} rows, {} inserted, {} errors, {:.0f} questions/s'.format(
+                report.rows, report.inserted, len(report.errors), report.rate), err=True)
+
+        report = ingest(rows, set(category_cache.types()), chunk_size, progress)
+        questions_changed()
+        for row, message in report.errors:
+            click.echo('line {}: {}'.format(row, message), err=True)
+        click.echo('Inserted {} of {} rows in {:.1f}s ({:.0f} questions/s)'.format(
+            report.inserted, report.rows, report.seconds, report.rate))
+
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
     def delete_question(question_id):
         try:
@@ -125,6 +249,9 @@ def create_app(test_config=None):
                 abort(422)
 
             question.delete()
+            invalidate_question_counts()
+            quiz_pool.remove(question_id)
+            searcher.remove(question_id)
 
             return jsonify({
                 'success': True
@@ -135,41 +262,60 @@ def create_app(test_config=None):
 
     @app.route("/category/<int:category_id>")
     def filter_by_category(category_id):
-        category = Category.query.get(category_id)
+        category = category_cache.get(category_id)
         if category is None:
             abort(422)
 
-        questions = Question.query.filter_by(category=category_id).all()
-        formatted_questions = paginate_questions(request, questions)
+        selection = Question.query.filter_by(category=category_id)
+        formatted_questions = paginate_questions(request, selection)
 
         return jsonify({
             'success': True,
             'questions': formatted_questions,
-            'currentCategory': category.format(),
-            'totalQuestions': len(questions)
+            'currentCategory': category,
+            'totalQuestions': count_questions(selection, key=('category', category_id)),
+            'next_cursor': next_cursor(formatted_questions)
         })
 
+    # a random question not asked yet. The client either sends the
+    # questions already asked (previous_questions) each time, or starts a
+    # server side quiz with "session": true and then only sends its quiz_id
     @app.route("/quizzes", methods=['POST'])
     def get_quizz_questions():
-        try:
-            body = request.get_json()
+        body = request.get_json(silent=True) or {}
+        quiz = None
 
-            previous_questions = body.get('previous_questions', None)
-            category = body.get('quiz_category', None)
+        if body.get('quiz_id') is not None:
+            quiz = quiz_sessions.get(body['quiz_id'])
+            if quiz is None:
+                abort(404)
+            category, seen = quiz.category, quiz.seen
+        else:
+            try:
+                category = body.get('quiz_category', None)
+                category = None if category is None else category_key(category['id'])
+                previous_questions = body.get('previous_questions', None)
+                if body.get('session'):
+                    quiz = quiz_sessions.start(category)
+                    quiz.seen.update(previous_questions or [])
+                    seen = quiz.seen
+                else:
+                    seen = set(previous_questions)
+            except (TypeError, KeyError, InvalidCategory):
+                abort(422)
 
-            if (category is None or category['id'] == 0):
-                next_question = Question.query.filter(
-                    ~Question.id.in_(previous_questions)).first()
-            else:
-                next_question = Question.query.filter_by(category=category['id']).filter(
-                    ~Question.id.in_(previous_questions)).first()
+        next_question = next_quiz_question(category, seen)
+        if quiz is not None and next_question is not None:
+            quiz.seen.add(next_question.id)
 
-            return jsonify({
-                'success': True,
-                'question': next_question.format()
-            })
-        except:
-            abort(422)
+        response = {
+            'success': True,
+            # no question left ends the quiz
+            'question': next_question.format() if next_question is not None else None
+        }
+        if quiz is not None:
+            response['quiz_id'] = quiz.id
+        return jsonify(response)
 
     @app.errorhandler(404)
     def not_found(error):
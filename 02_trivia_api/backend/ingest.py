@@ -0,0 +1,139 @@
+import csv
+import json
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Question
+
+# rows inserted by one transaction
+CHUNK_SIZE = 1000
+DIFFICULTIES = range(1, 6)
+
+
+class RowError(Exception):
+    '''A row of a batch that can't be inserted.'''
+
+
+class IngestReport:
+    '''Rows read, questions inserted and errors (row number, message) of a load.'''
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0
+
+    @property
+    def rate(self):
+        return self.inserted / self.seconds if self.seconds else 0
+
+    def format(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'errors': [{'row': row, 'message': message} for row, message in self.errors],
+            'seconds': round(self.seconds, 3)
+        }
+
+
+# columns of a question from a JSON object or a CSV row
+def question_mapping(row, category_ids):
+    if not isinstance(row, dict):
+        raise RowError('not an object')
+
+    mapping = {}
+    for field in ('question', 'answer'):
+        value = row.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise RowError('missing {}'.format(field))
+        mapping[field] = value.strip()
+
+    try:
+        category = int(row.get('category'))
+    except (TypeError, ValueError):
+        raise RowError('invalid category')
+    if category not in category_ids:
+        raise RowError('unknown category {}'.format(category))
+    mapping['category'] = str(category)
+
+    try:
+        difficulty = int(row.get('difficulty'))
+    except (TypeError, ValueError):
+        raise RowError('invalid difficulty')
+    if difficulty not in DIFFICULTIES:
+        raise RowError('difficulty out of range')
+    mapping['difficulty'] = difficulty
+    return mapping
+
+
+def insert_chunk(chunk, report):
+    # chunk is a list of (row number, mapping)
+    try:
+        db.session.bulk_insert_mappings(Question, [mapping for _, mapping in chunk])
+        db.session.commit()
+        report.inserted += len(chunk)
+        return
+    except SQLAlchemyError:
+        db.session.rollback()
+
+    # a row the database refused, the rows are inserted one by one to
+    # report it and keep the others
+    for number, mapping in chunk:
+        try:
+            db.session.bulk_insert_mappings(Question, [mapping])
+            db.session.commit()
+            report.inserted += 1
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            report.errors.append((number, str(getattr(error, 'orig', error))))
+
+
+# validates the (row number, row) pairs and inserts the valid ones in
+# transactions of chunk_size rows. A row is an object of the question
+# columns, or a RowError for a row that couldn't be read. on_chunk, if
+# given, is called with the report after each chunk.
+def ingest(rows, category_ids, chunk_size=CHUNK_SIZE, on_chunk=None):
+    report = IngestReport()
+    chunk = []
+    for number, row in rows:
+        report.rows += 1
+        try:
+            if isinstance(row, RowError):
+                raise row
+            chunk.append((number, question_mapping(row, category_ids)))
+        except RowError as error:
+            report.errors.append((number, str(error)))
+
+        if len(chunk) >= chunk_size:
+            insert_chunk(chunk, report)
+            chunk = []
+            if on_chunk is not None:
+                report.seconds = time.perf_counter() - report.started
+                on_chunk(report)
+
+    if chunk:
+        insert_chunk(chunk, report)
+    report.seconds = time.perf_counter() - report.started
+    if chunk and on_chunk is not None:
+        on_chunk(report)
+    return report
+
+
+# (line number, row) of a file of JSON objects, one per line
+def read_ndjson(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, RowError('invalid JSON')
+
+
+# (line number, row) of a CSV file with a header line naming the columns
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
@@ -0,0 +1,20 @@
+-- Indexes of the question search (search.DatabaseSearch): the full text
+-- index of the questions and answers, and the trigram index of their text
+-- for the substring matches. Also the (category, id) index of the pages of
+-- the questions of a category. setup_db only creates the missing tables, apply
+-- it to an existing database with
+--
+--     psql trivia < migrations/0001_question_search.sql
+--
+-- The indexes are built without locking the table against writes.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_search_document ON questions
+    USING gin ((setweight(to_tsvector('english'::regconfig, coalesce(question, '')), 'A') ||
+                setweight(to_tsvector('english'::regconfig, coalesce(answer, '')), 'B')));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_search_text ON questions
+    USING gin ((coalesce(question, '') || ' ' || coalesce(answer, '')) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_category_id ON questions (category, id);
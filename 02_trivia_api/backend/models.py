@@ -1,10 +1,13 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, create_engine
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from db_pool import engine_options
+
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get(
+    'DATABASE_URL', "postgres://{}/{}".format('localhost:5432', database_name))
 
 db = SQLAlchemy()
 
@@ -14,6 +17,8 @@ setup_db(app)
 '''
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
+    # pool sizing, recycling and pre-ping from the DB_POOL_* environment
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
@@ -25,6 +30,10 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  __table_args__ = (
+    # pages of the questions of a category, in id order
+    Index('ix_questions_category_id', 'category', 'id'),
+  )
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
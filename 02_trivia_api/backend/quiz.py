@@ -0,0 +1,151 @@
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# random picks tried before listing the unseen questions
+PICK_ATTEMPTS = 8
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCategory(ValueError):
+    '''A quiz category that isn't a category id.'''
+
+
+class QuestionPool:
+    '''
+    Ids of the quiz questions, per category (and all of them under None).
+
+    Each id list comes with an id -> position index so questions are added
+    and removed in O(1) (the removed id is swapped with the last one). The
+    pool is loaded on first use and reloaded every `ttl` seconds, so the
+    questions added or deleted by the other processes are picked up. An
+    invalidated pool is still picked from until it is reloaded.
+    '''
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.ids = None
+        self.positions = None
+        self.loaded_at = 0
+        self.invalidated = False
+        self.lock = threading.Lock()
+
+    def load(self, rows):
+        # rows are (id, category) pairs, a question whose category isn't an
+        # id is left out of the quizzes instead of failing the reload
+        with self.lock:
+            self.ids = {None: []}
+            self.positions = {None: {}}
+            for question_id, category in rows:
+                try:
+                    self._add(question_id, category)
+                except InvalidCategory:
+                    logger.warning('question %s has an invalid category %r', question_id, category)
+            self.loaded_at = time.monotonic()
+            self.invalidated = False
+
+    def expired(self):
+        return self.ids is None or self.invalidated or time.monotonic() - self.loaded_at > self.ttl
+
+    def invalidate(self):
+        self.invalidated = True
+
+    def _add(self, question_id, category):
+        for key in (None, category_key(category)):
+            ids = self.ids.setdefault(key, [])
+            positions = self.positions.setdefault(key, {})
+            if question_id not in positions:
+                positions[question_id] = len(ids)
+                ids.append(question_id)
+
+    def _remove(self, question_id):
+        # a question is in the list of all of them and in one category list
+        for key, positions in self.positions.items():
+            ids = self.ids[key]
+            position = positions.pop(question_id, None)
+            if position is None:
+                continue
+            last = ids.pop()
+            if last != question_id:
+                ids[position] = last
+                positions[last] = position
+
+    def add(self, question_id, category):
+        with self.lock:
+            if self.ids is not None:
+                self._add(question_id, category)
+
+    def remove(self, question_id):
+        with self.lock:
+            if self.ids is not None:
+                self._remove(question_id)
+
+    # a uniformly random question id of a category (None for all of them)
+    # not in `seen`, None once every question was seen. Random picks are
+    # O(1) and kept while most questions are unseen, the unseen ones are
+    # listed only when the picks keep hitting seen questions.
+    def pick(self, category, seen):
+        with self.lock:
+            ids = (self.ids or {}).get(category_key(category), [])
+            if len(seen) < len(ids):
+                for _ in range(PICK_ATTEMPTS):
+                    question_id = random.choice(ids)
+                    if question_id not in seen:
+                        return question_id
+            unseen = [question_id for question_id in ids if question_id not in seen]
+        return random.choice(unseen) if unseen else None
+
+
+# the pool key of a quiz category, None for all of them. Raises
+# InvalidCategory if it isn't a category id
+def category_key(category):
+    if category in (None, '', 0, '0'):
+        return None
+    try:
+        return int(category)
+    except (TypeError, ValueError):
+        raise InvalidCategory(category)
+
+
+class QuizSession:
+    '''Category and questions already asked of a quiz played on the server.'''
+
+    def __init__(self, category):
+        self.id = uuid.uuid4().hex
+        self.category = category
+        self.seen = set()
+        self.used_at = time.monotonic()
+
+
+class QuizSessions:
+    '''Running quizzes by id, the least recently used ones expire first.'''
+
+    def __init__(self, max_sessions=10000, ttl=3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def start(self, category):
+        quiz = QuizSession(category)
+        with self.lock:
+            self.sessions[quiz.id] = quiz
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        return quiz
+
+    def get(self, quiz_id):
+        with self.lock:
+            quiz = self.sessions.get(quiz_id)
+            if quiz is None:
+                return None
+            if time.monotonic() - quiz.used_at > self.ttl:
+                del self.sessions[quiz_id]
+                return None
+            quiz.used_at = time.monotonic()
+            self.sessions.move_to_end(quiz_id)
+            return quiz
@@ -0,0 +1,201 @@
+import bisect
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import bindparam, func, literal_column, or_
+
+from models import db, Question
+
+# the expressions of the indexes created by migrations/0001_question_search.sql,
+# the queries must use them as they are for the indexes to be used
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+SEARCH_DOCUMENT = literal_column(
+    "(setweight(to_tsvector('english'::regconfig, coalesce(question, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(answer, '')), 'B'))")
+SEARCH_TEXT = literal_column("(coalesce(question, '') || ' ' || coalesce(answer, ''))")
+
+# weights of the words of the questions and of the answers in the index
+QUESTION_WEIGHT = 2
+ANSWER_WEIGHT = 1
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+# LIKE pattern of a substring, escaped with !
+def like_pattern(term):
+    escaped = term.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+    return '%{}%'.format(escaped)
+
+
+class DatabaseSearch:
+    '''
+    Questions searched and ranked by PostgreSQL.
+
+    The words of the term are matched against the full text index of the
+    questions and answers, and the term as a substring against their trigram
+    index. The matches are ranked by ts_rank_cd, a word of a question weighs
+    more than a word of an answer, and only the page asked is loaded.
+    '''
+
+    def search(self, term, offset, limit):
+        query = func.plainto_tsquery(SEARCH_CONFIG, term)
+        matches = Question.query.filter(or_(
+            SEARCH_DOCUMENT.op('@@')(query),
+            SEARCH_TEXT.ilike(bindparam('pattern', like_pattern(term)), escape='!')))
+        questions = matches.order_by(
+            func.ts_rank_cd(SEARCH_DOCUMENT, query).desc(), Question.id
+        ).offset(offset).limit(limit).all()
+        return questions, count_matches(matches, offset, questions, limit)
+
+    def add(self, question):
+        pass
+
+    def remove(self, question_id):
+        pass
+
+    def invalidate(self):
+        pass
+
+
+# total of the matches, not counted when the page is the last one
+def count_matches(matches, offset, questions, limit):
+    if len(questions) < limit and (questions or offset == 0):
+        return offset + len(questions)
+    return matches.with_entities(func.count(Question.id)).order_by(None).scalar()
+
+
+class InvertedIndex:
+    '''
+    Words of the questions and answers -> weighted question ids.
+
+    A question matches when each word of the term starts one of its words,
+    and ranks by the weights of the words matched. The sorted list of the
+    words, used to find the ones a prefix starts, is rebuilt on the first
+    search after a change.
+    '''
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.words = []
+        self.sorted = True
+
+    def add(self, question_id, question, answer):
+        if question_id in self.documents:
+            self.remove(question_id)
+        weights = Counter()
+        for word in tokenize(question):
+            weights[word] += QUESTION_WEIGHT
+        for word in tokenize(answer):
+            weights[word] += ANSWER_WEIGHT
+        for word, weight in weights.items():
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = {}
+                self.sorted = False
+            postings[question_id] = weight
+        self.documents[question_id] = list(weights)
+
+    def remove(self, question_id):
+        for word in self.documents.pop(question_id, ()):
+            postings = self.postings[word]
+            del postings[question_id]
+            if not postings:
+                del self.postings[word]
+                self.sorted = False
+
+    def words_starting(self, prefix):
+        if not self.sorted:
+            self.words = sorted(self.postings)
+            self.sorted = True
+        index = bisect.bisect_left(self.words, prefix)
+        while index < len(self.words) and self.words[index].startswith(prefix):
+            yield self.words[index]
+            index += 1
+
+    # ids of the matching questions, best first (in id order for a term
+    # without words)
+    def search(self, term):
+        words = tokenize(term)
+        if not words:
+            return sorted(self.documents)
+
+        scores = None
+        for word in words:
+            word_scores = Counter()
+            for match in self.words_starting(word):
+                word_scores.update(self.postings[match])
+            if scores is not None:
+                word_scores = Counter({question_id: score + word_scores[question_id]
+                                       for question_id, score in scores.items()
+                                       if question_id in word_scores})
+            scores = word_scores
+            if not scores:
+                return []
+        return sorted(scores, key=lambda question_id: (-scores[question_id], question_id))
+
+
+class IndexSearch:
+    '''
+    Questions searched in an InvertedIndex of the process, for the databases
+    without full text search (like SQLite). It matches word prefixes only,
+    without the stemming and the substrings of DatabaseSearch. The index is
+    loaded on first use and reloaded every `ttl` seconds, only the questions
+    of the page asked are read from the database. An invalidated index is
+    still searched until it is reloaded, so a search running meanwhile
+    always has one.
+    '''
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.index = None
+        self.loaded_at = 0
+        self.invalidated = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        index = InvertedIndex()
+        for question_id, question, answer in db.session.query(
+                Question.id, Question.question, Question.answer):
+            index.add(question_id, question, answer)
+        with self.lock:
+            self.index = index
+            self.loaded_at = time.monotonic()
+            self.invalidated = False
+
+    def expired(self):
+        return self.index is None or self.invalidated or time.monotonic() - self.loaded_at > self.ttl
+
+    def invalidate(self):
+        self.invalidated = True
+
+    def search(self, term, offset, limit):
+        if self.expired():
+            self.load()
+        with self.lock:
+            ids = self.index.search(term)
+        page = ids[offset:offset + limit]
+        # deleted by another process since the index was loaded
+        questions = {question.id: question
+                     for question in Question.query.filter(Question.id.in_(page))}
+        return [questions[question_id] for question_id in page if question_id in questions], len(ids)
+
+    def add(self, question):
+        with self.lock:
+            if self.index is not None:
+                self.index.add(question.id, question.question, question.answer)
+
+    def remove(self, question_id):
+        with self.lock:
+            if self.index is not None:
+                self.index.remove(question_id)
+
+
+def question_search(engine):
+    if engine.dialect.name == 'postgresql':
+        return DatabaseSearch()
+    return IndexSearch()
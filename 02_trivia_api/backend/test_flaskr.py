@@ -6,6 +6,8 @@ from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
 from models import setup_db, Question, Category
+from query_budget import QueryBudgetExceeded
+from quiz import QuestionPool
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -41,6 +43,19 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['categories'])
         self.assertTrue(data['currentCategory'])
 
+    # test for GET /questions
+    def test_get_questions_after_cursor(self):
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+        cursor = data['next_cursor']
+        self.assertEqual(cursor, data['questions'][-1]['id'])
+
+        res = self.client().get('/questions?after={}'.format(cursor))
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['questions'])
+        self.assertTrue(all(question['id'] > cursor for question in data['questions']))
+
     # test for GET /questions
     def test_failed_get_questions_nonexistent_page(self):
         res = self.client().get('/questions?page=100')
@@ -57,6 +72,22 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['categories'])
 
+    # test for GET /categories
+    def test_get_categories_not_modified(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+    # test for GET /categories
+    def test_get_categories_not_modified_without_query(self):
+        etag = self.client().get('/categories').headers['ETag']
+        self.app.config['QUERY_BUDGETS'] = {'/categories': 0}
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['ETag'], etag)
+
     # test for GET /categories
     def test_get_categories_with_wrong_method(self):
         res = self.client().post('/categories')
@@ -125,6 +156,41 @@ class TriviaTestCase(unittest.TestCase):
         inserted_question = Question.query.filter_by(question=new_question).first()
         self.assertEqual(data['question_id'], inserted_question.id)
 
+    # test for POST /questions
+    def test_create_question_with_invalid_category(self):
+        new_question = 'Test Question'+str(datetime.datetime.now())
+        for category in ('abc', 1000):
+            body = {
+                'question': new_question,
+                'answer': 'Test Answer',
+                'difficulty': 4,
+                'category': category
+            }
+            res = self.client().post('/questions', json=body)
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 422)
+            self.assertEqual(data['success'], False)
+        self.assertEqual(Question.query.filter_by(question=new_question).count(), 0)
+
+    # test for POST /questions/batch
+    def test_create_questions_batch_with_invalid_row(self):
+        new_question = 'Test Question'+str(datetime.datetime.now())
+        body = {
+            'questions': [
+                {'question': new_question, 'answer': 'Test Answer',
+                 'difficulty': 4, 'category': 1},
+                {'question': new_question, 'answer': '',
+                 'difficulty': 4, 'category': 1}
+            ]
+        }
+        res = self.client().post('/questions/batch', json=body)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual([error['row'] for error in data['errors']], [1])
+        self.assertEqual(Question.query.filter_by(question=new_question).count(), 1)
+
     # test for POST /questions
     def test_create_question_without_answer(self):
         new_question = 'Test Question'+str(datetime.datetime.now())
@@ -170,6 +236,14 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['totalQuestions'], 0)
         self.assertEqual(len(data['questions']), 0)
 
+    # test for POST /questions
+    def test_search_questions_by_answer(self):
+        res = self.client().post('/questions', json={'searchTerm': 'uruguay'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertIn('Uruguay', [question['answer'] for question in data['questions']])
+
     # test for POST /questions
     def test_search_questions_nonexistent_page(self):
         search_term = 'world cup'
@@ -202,6 +276,65 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['question'])
         self.assertEqual(data['question'], questions[0].format())
 
+    # test for POST /quizzes
+    def test_quiz_session_asks_every_question_once(self):
+        category = Category.query.first()
+        questions = Question.query.filter_by(category=category.id).all()
+        body = {
+            'quiz_category': {'type': category.type, 'id': category.id},
+            'session': True
+        }
+        res = self.client().post('/quizzes', json=body)
+        data = json.loads(res.data)
+        quiz_id = data['quiz_id']
+        asked = [data['question']['id']]
+        while True:
+            res = self.client().post('/quizzes', json={'quiz_id': quiz_id})
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            if data['question'] is None:
+                break
+            asked.append(data['question']['id'])
+        self.assertEqual(sorted(asked), sorted(question.id for question in questions))
+
+    # test for POST /quizzes
+    def test_return_quiz_question_non_numeric_category(self):
+        for session in (False, True):
+            body = {
+                'previous_questions': [],
+                'quiz_category': {'type': 'Science', 'id': 'abc'},
+                'session': session
+            }
+            res = self.client().post('/quizzes', json=body)
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 422)
+            self.assertEqual(data['success'], False)
+
+    # test for the quiz question pool
+    def test_question_pool_skips_invalid_categories(self):
+        pool = QuestionPool()
+        pool.load([(1, '1'), (2, 'abc'), (3, None)])
+        self.assertIn(pool.pick(None, set()), (1, 3))
+        self.assertEqual(pool.pick('1', set()), 1)
+        self.assertIsNone(pool.pick(None, {1, 3}))
+
+    # test for the quiz question pool
+    def test_invalidated_question_pool_is_picked_until_reloaded(self):
+        pool = QuestionPool()
+        pool.load([(1, '1')])
+        pool.invalidate()
+        self.assertTrue(pool.expired())
+        self.assertEqual(pool.pick('1', set()), 1)
+        pool.add(2, '1')
+        pool.load([(1, '1'), (3, '1')])
+        self.assertFalse(pool.expired())
+        self.assertEqual(pool.pick('1', {1}), 3)
+
+    # test for POST /quizzes
+    def test_unknown_quiz_session(self):
+        res = self.client().post('/quizzes', json={'quiz_id': 'unknown'})
+        self.assertEqual(res.status_code, 404)
+
     # test for POST /quizzes
     def test_failed_return_quiz_question_wrong_format_input_category(self):
         category = Category.query.first()
@@ -218,6 +351,21 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Could not process request')
 
+    # test for GET /metrics
+    def test_metrics(self):
+        self.client().get('/categories')
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'http_request_queries_count{route="/categories",method="GET"} 1',
+                      res.data)
+
+    # test for the query budget
+    def test_query_budget_exceeded(self):
+        self.app.config['TESTING'] = True
+        self.app.config['QUERY_BUDGETS'] = {'/categories': 0}
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client().get('/categories')
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
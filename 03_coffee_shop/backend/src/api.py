@@ -6,9 +6,12 @@ from flask_cors import CORS
 
 from .database.models import db_drop_and_create_all, setup_db, Drink
 from .auth.auth import AuthError, requires_auth
+from .instrumentation import Instrumentation
 
 app = Flask(__name__)
 setup_db(app)
+# per route query counts and timings, served at /metrics
+Instrumentation(app)
 CORS(app, resources={r"*": {'origins': r"*"}})
 
 
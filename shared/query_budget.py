@@ -0,0 +1,38 @@
+# Shared by the apps, each one carries a copy of this file: edit
+# shared/query_budget.py and run `python shared/vendor.py` to update the
+# copies (`--check` only compares them).
+from flask import current_app, request
+
+
+class QueryBudgetExceeded(Exception):
+    '''A request issued more SQL statements than the budget of its route.'''
+
+
+class QueryBudget:
+    '''
+    Maximum number of SQL statements of the requests, counted by the
+    Instrumentation of the app.
+
+    With QUERY_BUDGET (every route) or QUERY_BUDGETS (route rule -> budget)
+    set, a request issuing more statements than the budget of its route
+    raises QueryBudgetExceeded, which fails the request and the tests.
+    '''
+
+    def __init__(self, instrumentation, app=None):
+        self.instrumentation = instrumentation
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_BUDGET', None)
+        app.config.setdefault('QUERY_BUDGETS', {})
+        self.instrumentation.add_check(self.check)
+
+    def budget(self, route):
+        return current_app.config['QUERY_BUDGETS'].get(route, current_app.config['QUERY_BUDGET'])
+
+    def check(self, route, stats):
+        budget = self.budget(route)
+        if budget is not None and stats.queries > budget:
+            raise QueryBudgetExceeded('{} {} issued {} SQL statements, its budget is {}'.format(
+                request.method, route, stats.queries, budget))
@@ -0,0 +1,65 @@
+'''
+Copy the shared modules into the apps using them.
+
+The apps are installed and deployed on their own, so each one carries a
+copy of the modules of this folder instead of importing them from here.
+This folder is the source of the copies:
+
+    $ python shared/vendor.py            # update the copies
+    $ python shared/vendor.py --check    # exit with 1 if a copy differs
+'''
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED = os.path.join(ROOT, 'shared')
+
+# shared module -> folders of the apps importing it
+VENDORED = {
+    'instrumentation.py': ['01_fyyur', '02_trivia_api/backend', '03_coffee_shop/backend/src'],
+    'query_budget.py': ['01_fyyur', '02_trivia_api/backend'],
+    'db_pool.py': ['01_fyyur', '02_trivia_api/backend'],
+}
+
+
+def read(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+# (source, copy) paths of the copies that differ from their source
+def outdated():
+    for module, folders in VENDORED.items():
+        source = os.path.join(SHARED, module)
+        for folder in folders:
+            copy = os.path.join(ROOT, folder, module)
+            if read(copy) != read(source):
+                yield source, copy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--check', action='store_true',
+                        help='only compare the copies with their source')
+    args = parser.parse_args()
+
+    differences = list(outdated())
+    for source, copy in differences:
+        copy_name = os.path.relpath(copy, ROOT)
+        if args.check:
+            print('{} differs from {}'.format(copy_name, os.path.relpath(source, ROOT)))
+        else:
+            with open(copy, 'w', encoding='utf-8') as file:
+                file.write(read(source))
+            print('updated {}'.format(copy_name))
+
+    if args.check and differences:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())